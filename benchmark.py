@@ -0,0 +1,268 @@
+"""
+Benchmark the mesh pipeline on deterministic synthetic meshes.
+
+Usage:
+    python benchmark.py --sizes 10k 100k --output results.json
+    python benchmark.py --baseline baseline.json --threshold 0.15
+    python benchmark.py --save-baseline baseline.json
+
+Every stage is timed (best of --repeats runs) and, unless --no-memory is
+given, run twice more: once while a thread samples the process RSS, which
+sees every allocation including VTK's, and once under tracemalloc, which
+only sees the Python heap and numpy buffers. With --baseline the run exits
+non-zero if any stage got slower, or its peak RSS grew, by more than
+--threshold; the tracemalloc peak is reported but not compared.
+"""
+import argparse
+import ctypes
+import ctypes.util
+import gc
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+
+from mesh_data_structure import build_mesh_from_stl, load_mesh
+from mesh_export import save_arrays_to_stl
+from mesh_generators import GENERATORS
+from mesh_instrumentation import current_rss_bytes
+from mesh_operations import laplacian_smoothing, beautify_mesh
+from mesh_sanity_check import sanity_check_mesh
+
+SIZES = {
+    "10k": 10_000,
+    "100k": 100_000,
+    "1m": 1_000_000,
+    "10m": 10_000_000,
+}
+
+# name -> (function taking the prepared input, whether it mutates the mesh)
+STAGES = {
+    "load_mesh": (lambda stl_path, mesh: load_mesh(stl_path), False),
+    "build_mesh_from_stl": (lambda stl_path, mesh: build_mesh_from_stl(stl_path), False),
+    "sanity_check_mesh": (lambda stl_path, mesh: sanity_check_mesh(*mesh), False),
+    "laplacian_smoothing": (lambda stl_path, mesh: laplacian_smoothing(*mesh, iterations=1), True),
+    "beautify_mesh": (lambda stl_path, mesh: beautify_mesh(*mesh), True),
+}
+
+
+def _release_free_heap():
+    """Hand freed heap pages back to the OS (glibc only) so RSS growth starts from what is in use."""
+    try:
+        ctypes.CDLL(ctypes.util.find_library("c")).malloc_trim(0)
+    except (OSError, AttributeError, TypeError):
+        pass
+
+
+class _RssSampler:
+    """Polls the process RSS on a thread; stop() returns the peak above the RSS at start."""
+
+    def __init__(self, interval=0.001):
+        self.interval = interval
+        self.start_rss = current_rss_bytes()
+        self.peak = self.start_rss
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._done.wait(self.interval):
+            self.peak = max(self.peak, current_rss_bytes())
+
+    def start(self):
+        if self.start_rss is not None:
+            self._thread.start()
+
+    def stop(self):
+        """Peak RSS growth in bytes, or None where RSS cannot be read."""
+        if self.start_rss is None:
+            return None
+        self._done.set()
+        self._thread.join()
+        return max(self.peak, current_rss_bytes()) - self.start_rss
+
+
+def _measure(func, memory=None):
+    """
+    Run func once; return (seconds, peak bytes or None).
+    memory: None, "rss" (sampled peak RSS growth) or "python" (tracemalloc peak).
+    """
+    gc.collect()
+    if memory == "rss":
+        _release_free_heap()
+    sampler = _RssSampler() if memory == "rss" else None
+    if sampler:
+        sampler.start()
+    elif memory == "python":
+        tracemalloc.start()
+    start = time.perf_counter()
+    func()
+    seconds = time.perf_counter() - start
+    peak = None
+    if sampler:
+        peak = sampler.stop()
+    elif memory == "python":
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return seconds, peak
+
+
+def benchmark_case(stl_path, stages, repeats=3, memory=True, progress_callback=None):
+    """Time (and optionally memory-profile) each stage on one STL file."""
+    results = {}
+    shared_mesh = build_mesh_from_stl(stl_path)
+    for name in stages:
+        func, mutates = STAGES[name]
+        if progress_callback:
+            progress_callback(f"  {name}...")
+
+        def prepared():
+            mesh = build_mesh_from_stl(stl_path) if mutates else shared_mesh
+            return lambda: func(stl_path, mesh)
+
+        timings = [_measure(prepared())[0] for _ in range(repeats)]
+        results[name] = {
+            "seconds": min(timings),
+            "mean_seconds": sum(timings) / len(timings),
+            # RSS covers native (VTK) allocations; the tracemalloc peak is Python heap only.
+            "peak_rss_bytes": _measure(prepared(), memory="rss")[1] if memory else None,
+            "python_peak_bytes": _measure(prepared(), memory="python")[1] if memory else None,
+        }
+    return results
+
+
+def run_benchmarks(generators, sizes, stages=None, repeats=3, memory=True, seed=0, progress_callback=None):
+    """
+    Generate each (generator, size) mesh, write it to a temporary STL and
+    benchmark every stage on it. Returns a JSON-serialisable dict.
+    """
+    stages = list(stages or STAGES)
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "repeats": repeats,
+            "seed": seed,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "cases": {},
+    }
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for gen_name in generators:
+            for size_name in sizes:
+                case = f"{gen_name}-{size_name}"
+                if progress_callback:
+                    progress_callback(f"{case}: generating...")
+                generator = GENERATORS[gen_name]
+                if gen_name in ("noisy_scan", "shell_soup"):
+                    points, faces = generator(SIZES[size_name], seed=seed)
+                else:
+                    points, faces = generator(SIZES[size_name])
+                stl_path = os.path.join(tmp_dir, f"{case}.stl")
+                save_arrays_to_stl(points, faces, stl_path)
+
+                report["cases"][case] = {
+                    "vertices": int(len(points)),
+                    "faces": int(len(faces)),
+                    "stages": benchmark_case(stl_path, stages, repeats, memory, progress_callback),
+                }
+                os.remove(stl_path)
+    return report
+
+
+# Compared metric -> absolute change ignored as noise (RSS moves in pages and arena reuse).
+_COMPARED = {"seconds": 0.0, "peak_rss_bytes": 2**20}
+
+
+def compare_to_baseline(report, baseline, threshold=0.10):
+    """
+    Compare a run against a stored baseline.
+    Returns a list of regression messages (empty if nothing regressed).
+    """
+    regressions = []
+    for case, data in report["cases"].items():
+        base_case = baseline.get("cases", {}).get(case)
+        if base_case is None:
+            continue
+        for stage, metrics in data["stages"].items():
+            base_metrics = base_case["stages"].get(stage)
+            if base_metrics is None:
+                continue
+            for key, noise in _COMPARED.items():
+                new, old = metrics.get(key), base_metrics.get(key)
+                if new is None or not old or new - old <= noise:
+                    continue
+                change = (new - old) / old
+                if change > threshold:
+                    regressions.append(f"{case} / {stage}: {key} {old:.4g} -> {new:.4g} (+{change * 100:.1f}%)")
+    return regressions
+
+
+def _format_bytes(value):
+    return f"{value / 2**20:9.1f} MiB" if value is not None else "        n/a"
+
+
+def format_report(report):
+    lines = []
+    for case, data in report["cases"].items():
+        lines.append(f"{case} ({data['vertices']} vertices, {data['faces']} faces)")
+        lines.append(f"  {'stage':<22} {'time':>12}  {'peak RSS':>13}  {'Python heap':>13}")
+        for stage, metrics in data["stages"].items():
+            lines.append(f"  {stage:<22} {metrics['seconds']:10.4f} s  {_format_bytes(metrics['peak_rss_bytes'])}"
+                         f"  {_format_bytes(metrics['python_peak_bytes'])}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the mesh pipeline on synthetic meshes.")
+    parser.add_argument("--generators", nargs="+", default=list(GENERATORS), choices=list(GENERATORS))
+    parser.add_argument("--sizes", nargs="+", default=["10k"], choices=list(SIZES))
+    parser.add_argument("--stages", nargs="+", default=list(STAGES), choices=list(STAGES))
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-memory", action="store_true", help="skip the RSS and tracemalloc passes")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", help="baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="allowed relative slowdown or RSS growth (0.10 = 10%%)")
+    parser.add_argument("--save-baseline", help="also write this run as a new baseline file")
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(
+        args.generators, args.sizes, args.stages,
+        repeats=args.repeats, memory=not args.no_memory, seed=args.seed,
+        progress_callback=print,
+    )
+    print(format_report(report))
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Results saved to {args.output}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Baseline saved to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(report, baseline, args.threshold)
+        if regressions:
+            print(f"❌ {len(regressions)} regression(s) above {args.threshold * 100:.0f}%:")
+            for line in regressions:
+                print("  " + line)
+            return 1
+        print("✅ No regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,12 +3,26 @@ from tkinter import filedialog, messagebox
 import numpy as np
 from multiprocessing import Process
 import threading
+import os
 import mesh_io
 import viewer
-from mesh_export import save_mesh_to_json, save_mesh_to_stl
-from mesh_data_structure import build_mesh_from_stl
+from mesh_export import save_mesh_to_json, save_arrays_to_stl
+from mesh_data_structure import LazyMesh, load_mesh as load_lazy_mesh, mesh_to_arrays
 from mesh_sanity_check import sanity_check_mesh, generate_sanity_report
 from mesh_operations import laplacian_smoothing, point_to_mesh_distance, edges_with_large_angle
+from mesh_decimation import build_lod_proxies, cluster_vertices
+from mesh_instrumentation import instrumentation_from_env
+from mesh_out_of_core import build_out_of_core_mesh, sanity_check_out_of_core
+from mesh_history import MeshHistory, CoordinateDelta, EdgeFlipDelta
+from mesh_deviation import compare_meshes, format_deviation_report
+from mesh_remeshing import isotropic_remesh
+from mesh_containment import voxelize_mesh
+from mesh_slicing import slice_mesh
+
+# Above this size, offer to open an STL file out of core instead of loading it.
+LARGE_FILE_BYTES = 512 * 2**20
+NOT_UNDOABLE = "This edit is too large for the undo history and cannot be undone.\nEarlier undo steps were discarded."
+
 
 def gui_load_and_view():
     root = tk.Tk()
@@ -30,26 +44,96 @@ def gui_load_and_view():
     action_menu.add_command(label="Laplacian Smoothing", state='disabled', command=lambda: laplacian_smoothing_gui())
     action_menu.add_command(label="Highlight Sharp Edges", state='disabled', command=lambda: highlight_sharp_edges())
     action_menu.add_command(label="BeautiFill Mesh", state='disabled', command=lambda: beautify_mesh_gui())
+    action_menu.add_command(label="Isotropic Remeshing", state='disabled', command=lambda: remesh_gui())
+    action_menu.add_command(label="Show LOD Preview", state='disabled', command=lambda: show_lod_preview())
+    action_menu.add_command(label="Out-of-Core Sanity Check", state='disabled', command=lambda: out_of_core_check())
+    action_menu.add_command(label="Deviation From Original", state='disabled', command=lambda: deviation_from_original())
+    action_menu.add_command(label="Voxelize Mesh", state='disabled', command=lambda: voxelize_gui())
+    action_menu.add_command(label="Slice Preview", state='disabled', command=lambda: slice_gui())
+
+    edit_menu = tk.Menu(menubar, tearoff=0)
+    menubar.add_cascade(label="Edit", menu=edit_menu)
+    edit_menu.add_command(label="Undo", state='disabled', command=lambda: undo_edit())
+    edit_menu.add_command(label="Redo", state='disabled', command=lambda: redo_edit())
 
     status_var = tk.StringVar()
     status_var.set("No mesh loaded")
     status_label = tk.Label(root, textvariable=status_var, font=("Arial", 10))
     status_label.pack(pady=(10, 0))
 
+    def show_stage_status(msg):
+        status_var.set(f"🛠️ {msg}")
+        root.update_idletasks()
+
+    # Stage events go to the status line, the 'mesh' logger and, if MESH_TRACE_FILE is set, a JSON trace.
+    instrumentation = instrumentation_from_env(show_stage_status)
+    # Background work writes to the same logger and trace, but not to the status line.
+    background_instrumentation = instrumentation.background()
+
     app_state = {
         "vertices": None,
         "edges": None,
         "triangles": None,
-        "file_path": None
+        "file_path": None,
+        "lod_levels": None,
+        "mesh": None,
+        "original": None
     }
+    history = MeshHistory()
 
-    def update_mesh_info(vertices, edges, triangles):
+    def update_mesh_info(vertices, edges, triangles, show_status=True):
+        # edges is None until something builds the edge table; it is never forced here.
+        edge_count = "not computed yet" if edges is None else len(edges)
         info_menu.delete(0, 'end')
         info_menu.add_command(label=f"Vertices: {len(vertices)}", state='disabled')
-        info_menu.add_command(label=f"Edges: {len(edges)}", state='disabled')
+        info_menu.add_command(label=f"Edges: {edge_count}", state='disabled')
         info_menu.add_command(label=f"Triangles: {len(triangles)}", state='disabled')
 
-        status_var.set(f"Vertices: {len(vertices)} | Edges: {len(edges)} | Triangles: {len(triangles)}")
+        if show_status:
+            status_var.set(f"Vertices: {len(vertices)} | Edges: {edge_count} | Triangles: {len(triangles)}")
+
+    def refresh_edge_count():
+        mesh = app_state["mesh"]
+        if mesh is not None and mesh.is_computed("edge_table"):
+            update_mesh_info(mesh.points, mesh.edges, mesh.faces, show_status=False)
+
+    def update_history_menu():
+        edit_menu.entryconfig("Undo", state="normal" if history.can_undo() else "disabled")
+        edit_menu.entryconfig("Redo", state="normal" if history.can_redo() else "disabled")
+
+    def apply_history(step, verb):
+        label = step(app_state["vertices"], app_state["edges"], app_state["triangles"])
+        update_history_menu()
+        if label is None:
+            return
+        status_var.set(f"↩️ {verb}: {label}")
+
+        def show_updated():
+            viewer.plot_mesh_from_data(app_state["vertices"], app_state["triangles"])
+
+        threading.Thread(target=show_updated, daemon=True).start()
+
+    def undo_edit():
+        apply_history(history.undo, "Undone")
+
+    def redo_edit():
+        apply_history(history.redo, "Redone")
+
+    def require_objects():
+        # Object lists are only built for operations that need them.
+        if app_state["vertices"] is None:
+            vertices, edges, triangles = app_state["mesh"].objects
+            app_state["vertices"] = vertices
+            app_state["edges"] = edges
+            app_state["triangles"] = triangles
+            refresh_edge_count()
+        return app_state["vertices"], app_state["edges"], app_state["triangles"]
+
+    def current_arrays():
+        # Edits live on the object lists once they exist; otherwise the arrays are current.
+        if app_state["vertices"] is None:
+            return app_state["mesh"].points, app_state["mesh"].faces
+        return mesh_to_arrays(app_state["vertices"], app_state["triangles"])
 
     def build_structure():
         def report_progress(msg):
@@ -60,16 +144,18 @@ def gui_load_and_view():
             action_menu.entryconfig("Build Data Structure", state="disabled")
             report_progress("⏳ Building Data Structure...")
 
-            vertices, edges, triangles = build_mesh_from_stl(
-                app_state["file_path"],
-                progress_callback=lambda percent: report_progress(f"🔧 Building... {percent}")
-            )
+            # Only the file is read here; edges, adjacency and normals are built on first use.
+            mesh = load_lazy_mesh(app_state["file_path"], progress_callback=instrumentation)
 
-            app_state["vertices"] = vertices
-            app_state["edges"] = edges
-            app_state["triangles"] = triangles
+            app_state["mesh"] = mesh
+            app_state["original"] = (np.array(mesh.points, dtype=float), np.array(mesh.faces))
+            app_state["vertices"] = None
+            app_state["edges"] = None
+            app_state["triangles"] = None
+            history.clear()
+            update_history_menu()
 
-            update_mesh_info(vertices, edges, triangles)
+            update_mesh_info(mesh.points, None, mesh.faces)
             messagebox.showinfo("Success", "Data Structure created successfully.")
 
             action_menu.entryconfig("Export Mesh", state="normal")
@@ -77,8 +163,10 @@ def gui_load_and_view():
             action_menu.entryconfig("Laplacian Smoothing", state="normal")
             action_menu.entryconfig("Highlight Sharp Edges", state="normal")
             action_menu.entryconfig("BeautiFill Mesh", state="normal")
-
-
+            action_menu.entryconfig("Isotropic Remeshing", state="normal")
+            action_menu.entryconfig("Deviation From Original", state="normal")
+            action_menu.entryconfig("Voxelize Mesh", state="normal")
+            action_menu.entryconfig("Slice Preview", state="normal")
 
             report_progress("✅ Data Structure ready")
 
@@ -88,7 +176,7 @@ def gui_load_and_view():
             action_menu.entryconfig("Build Data Structure", state="normal")
 
     def export_mesh():
-        if not app_state["vertices"]:
+        if app_state["mesh"] is None:
             messagebox.showwarning("No Data", "Please build the structure first.")
             return
 
@@ -101,26 +189,21 @@ def gui_load_and_view():
             return  # User canceled
 
         def run_export():
-            def progress_cb(percent):
-                status_var.set(f"📤 Exporting mesh... {percent}%")
-                root.update_idletasks()
-
             try:
                 if file_path.endswith(".json"):
+                    vertices, edges, triangles = require_objects()
                     save_mesh_to_json(
-                        app_state["vertices"],
-                        app_state["edges"],
-                        app_state["triangles"],
+                        vertices,
+                        edges,
+                        triangles,
                         filename=file_path,
-                        progress_callback=progress_cb
+                        progress_callback=instrumentation
                     )
                     messagebox.showinfo("Exported", f"Mesh exported to '{file_path}'.")
                 elif file_path.endswith(".stl"):
-                    save_mesh_to_stl(
-                        app_state["vertices"],
-                        app_state["triangles"],
-                        file_path
-                    )
+                    mesh = app_state["mesh"]
+                    mesh.sync_from_objects()  # pick up edits made on the object lists
+                    save_arrays_to_stl(mesh.points, mesh.faces, file_path)
                     messagebox.showinfo("Exported", f"Mesh exported to '{file_path}'.")
                 else:
                     raise ValueError("Unsupported file extension.")
@@ -143,6 +226,14 @@ def gui_load_and_view():
             messagebox.showinfo("No file selected", "Please select an STL file.")
             return
 
+        # A normal load reads the whole file twice: in the viewer and for the LOD proxies.
+        size = os.path.getsize(file_path)
+        out_of_core = size > LARGE_FILE_BYTES and messagebox.askyesno(
+            "Large File",
+            f"This file is {size / 2**20:.0f} MiB.\nOpen it out of core? The 3D preview, LOD proxies and "
+            "in-memory data structure are skipped; use Out-of-Core Sanity Check."
+        )
+
         def load():
             try:
                 def report_status(msg):
@@ -152,6 +243,12 @@ def gui_load_and_view():
                 report_status("⏳ Loading STL file...")
                 app_state["file_path"] = file_path
 
+                if out_of_core:
+                    report_status("✅ STL file opened out of core.")
+                    action_menu.entryconfig("Out-of-Core Sanity Check", state="normal")
+                    btn_load.config(state="disabled")
+                    return
+
                 # Launch viewer only
                 p = Process(target=viewer.plot_mesh_from_file, args=(file_path,))
                 p.daemon = True
@@ -161,6 +258,7 @@ def gui_load_and_view():
                 
                 # Enable buttons
                 action_menu.entryconfig("Build Data Structure", state="normal")
+                action_menu.entryconfig("Out-of-Core Sanity Check", state="normal")
                 action_menu.entryconfig("Export Mesh", state="disabled")
                 action_menu.entryconfig("Sanity Check Mesh", state="disabled") 
                 action_menu.entryconfig("BeautiFill Mesh", state="disabled")
@@ -168,28 +266,51 @@ def gui_load_and_view():
                 # Hide Load button
                 btn_load.config(state="disabled")
 
+                # Build LOD proxies in the background while the user works on full resolution
+                threading.Thread(target=build_lod_background, args=(file_path,), daemon=True).start()
+
             except Exception as e:
                 messagebox.showerror("Error", f"Failed to load/display mesh:\n{e}")
                 status_var.set("❌ Load failed")
 
         threading.Thread(target=load).start()
 
+    def build_lod_background(file_path):
+        try:
+            points, faces = mesh_io.load_stl_arrays(file_path)
+            # A clustered proxy takes a fraction of a second; the decimated levels replace it when ready.
+            app_state["lod_levels"] = [cluster_vertices(points, faces, max(len(faces) // 100, 100))]
+            action_menu.entryconfig("Show LOD Preview", state="normal")
+            levels = build_lod_proxies(points, faces, progress_callback=background_instrumentation)
+            if not levels:
+                levels = [(points, faces)]  # already small enough to show as is
+            app_state["lod_levels"] = levels
+            action_menu.entryconfig("Show LOD Preview", state="normal")
+        except Exception as e:
+            status_var.set(f"❌ LOD preview failed: {e}")
+
+    def show_lod_preview():
+        if not app_state["lod_levels"]:
+            messagebox.showwarning("No Data", "LOD preview is still being built.")
+            return
+
+        p = Process(target=viewer.plot_mesh_lod, args=(app_state["lod_levels"],))
+        p.daemon = True
+        p.start()
+
     def sanity_check():
-        if not app_state["vertices"]:
+        if app_state["mesh"] is None:
             messagebox.showwarning("No Data", "Please build the structure first.")
             return
 
-        def progress_update(msg):
-            status_var.set(f"🛠️ {msg}")
-            root.update_idletasks()
-
         def run_check():
             try:
+                vertices, edges, triangles = require_objects()
                 results = sanity_check_mesh(
-                    app_state["vertices"],
-                    app_state["edges"],
-                    app_state["triangles"],
-                    progress_callback=progress_update
+                    vertices,
+                    edges,
+                    triangles,
+                    progress_callback=instrumentation
                 )
 
                 msg = generate_sanity_report(results)
@@ -211,8 +332,29 @@ def gui_load_and_view():
 
         threading.Thread(target=run_check, daemon=True).start()
 
+    def out_of_core_check():
+        # Works straight from the STL file with bounded memory; no data structure needed.
+        def run_check():
+            mesh = None
+            try:
+                mesh = build_out_of_core_mesh(app_state["file_path"], progress_callback=instrumentation)
+                results = sanity_check_out_of_core(mesh, progress_callback=instrumentation)
+                msg = generate_sanity_report(results)
+
+                status_var.set("✅ Out-of-core sanity check done.")
+                messagebox.showinfo("Sanity Check Result", msg)
+
+            except Exception as e:
+                status_var.set("❌ Out-of-core check error")
+                messagebox.showerror("Error", f"Out-of-core check failed:\n{e}")
+            finally:
+                if mesh is not None:
+                    mesh.close()
+
+        threading.Thread(target=run_check, daemon=True).start()
+
     def laplacian_smoothing_gui():
-        if not app_state["vertices"]:
+        if app_state["mesh"] is None:
             messagebox.showwarning("No Data", "Please build the structure first.")
             return
 
@@ -230,21 +372,37 @@ def gui_load_and_view():
 
             status_var.set("🛠️ Applying Laplacian smoothing...")
             root.update_idletasks()
+            require_objects()
+            before_points, faces = current_arrays()
 
             vertices, diff_vectors = laplacian_smoothing(
                 app_state["vertices"],
                 app_state["edges"],
                 app_state["triangles"],
                 iterations=iterations,
-                lambda_factor=lambda_factor
+                lambda_factor=lambda_factor,
+                progress_callback=instrumentation
             )
 
             app_state["vertices"] = vertices  # update app state
+            after_points, _ = current_arrays()
+            moved = np.flatnonzero(np.any(after_points != before_points, axis=1))
+            undoable = history.push("Laplacian smoothing", [CoordinateDelta.from_previous(moved, before_points[moved])])
+            update_history_menu()
 
             moved_distances = np.linalg.norm(diff_vectors, axis=1)
             max_move = moved_distances.max()
 
-            messagebox.showinfo("Laplacian Smoothing", f"Smoothing done.\nMax vertex move distance: {max_move:.4f}")
+            # Surface deviation between the mesh before and after this smoothing run
+            deviation = compare_meshes(before_points, faces, after_points, faces,
+                                       progress_callback=instrumentation)
+
+            messagebox.showinfo(
+                "Laplacian Smoothing",
+                f"Smoothing done.\nMax vertex move distance: {max_move:.4f}\n{format_deviation_report(deviation)}"
+            )
+            if not undoable:
+                messagebox.showwarning("Undo", NOT_UNDOABLE)
 
             status_var.set("✅ Smoothing complete.")
 
@@ -258,7 +416,7 @@ def gui_load_and_view():
         threading.Thread(target=run_smoothing, daemon=True).start()
 
     def highlight_sharp_edges():
-        if not app_state["vertices"]:
+        if app_state["mesh"] is None:
             messagebox.showwarning("No Data", "Please build the structure first.")
             return
 
@@ -268,6 +426,7 @@ def gui_load_and_view():
             return
 
         from mesh_operations import edges_with_large_angle
+        require_objects()
         sharp_edges = edges_with_large_angle(app_state["edges"], app_state["triangles"], threshold_deg=threshold)
 
         if not sharp_edges:
@@ -284,7 +443,7 @@ def gui_load_and_view():
         threading.Thread(target=run_view, daemon=True).start()
 
     def beautify_mesh_gui():
-        if not app_state["vertices"]:
+        if app_state["mesh"] is None:
             messagebox.showwarning("No Data", "Please build the structure first.")
             return
 
@@ -293,15 +452,23 @@ def gui_load_and_view():
 
             status_var.set("🛠️ Beautifying mesh (edge flips)...")
             root.update_idletasks()
+            require_objects()
 
+            flip_log = []
             flip_count = beautify_mesh(
                 app_state["vertices"],
                 app_state["edges"],
-                app_state["triangles"]
+                app_state["triangles"],
+                progress_callback=instrumentation,
+                flip_log=flip_log
             )
+            undoable = history.push("BeautiFill", [EdgeFlipDelta(flip_log)])
+            update_history_menu()
 
             status_var.set(f"✅ Beautification complete. {flip_count} edges flipped.")
             messagebox.showinfo("BeautiFill Result", f"Beautification done.\nEdges flipped: {flip_count}")
+            if not undoable:
+                messagebox.showwarning("Undo", NOT_UNDOABLE)
 
             # Show updated mesh
             def show_updated():
@@ -311,6 +478,151 @@ def gui_load_and_view():
 
         threading.Thread(target=run_beautify, daemon=True).start()
 
+    def remesh_gui():
+        if app_state["mesh"] is None:
+            messagebox.showwarning("No Data", "Please build the structure first.")
+            return
+
+        import tkinter.simpledialog as sd
+        points, faces = current_arrays()
+        mean_length = float(np.linalg.norm(points[faces[:, 0]] - points[faces[:, 1]], axis=1).mean())
+        target_length = sd.askfloat("Isotropic Remeshing", "Target edge length:", minvalue=1e-9, initialvalue=round(mean_length, 6))
+        if target_length is None:
+            return
+        iterations = sd.askinteger("Isotropic Remeshing", "Number of iterations:", minvalue=1, maxvalue=50, initialvalue=5)
+        if iterations is None:
+            return
+
+        def run_remesh():
+            try:
+                status_var.set("🛠️ Remeshing...")
+                root.update_idletasks()
+                new_points, new_faces = isotropic_remesh(
+                    points, faces,
+                    target_length=target_length,
+                    iterations=iterations,
+                    progress_callback=instrumentation
+                )
+
+                # Connectivity changed completely: start over from the new arrays.
+                mesh = LazyMesh(new_points, new_faces, progress_callback=instrumentation)
+                app_state["mesh"] = mesh
+                app_state["vertices"] = None
+                app_state["edges"] = None
+                app_state["triangles"] = None
+                history.clear()
+                update_history_menu()
+
+                update_mesh_info(mesh.points, None, mesh.faces)
+                messagebox.showinfo("Isotropic Remeshing", f"Remeshing done.\nTriangles: {len(faces)} -> {len(new_faces)}")
+
+                def show_updated():
+                    viewer.plot_mesh_from_data(new_points, new_faces)
+
+                threading.Thread(target=show_updated, daemon=True).start()
+
+            except Exception as e:
+                status_var.set("❌ Remeshing failed")
+                messagebox.showerror("Error", f"Remeshing failed:\n{e}")
+
+        threading.Thread(target=run_remesh, daemon=True).start()
+
+    def deviation_from_original():
+        if app_state["mesh"] is None:
+            messagebox.showwarning("No Data", "Please build the structure first.")
+            return
+
+        def run_deviation():
+            try:
+                status_var.set("🛠️ Measuring deviation from the original mesh...")
+                root.update_idletasks()
+                original_points, original_faces = app_state["original"]
+                points, faces = current_arrays()
+                deviation = compare_meshes(original_points, original_faces, points, faces,
+                                           signed=True, progress_callback=instrumentation)
+
+                status_var.set(f"✅ Hausdorff distance to original: {deviation['hausdorff']:.4g}")
+                messagebox.showinfo("Deviation From Original", format_deviation_report(deviation))
+
+                p = Process(target=viewer.plot_mesh_deviation,
+                            args=(points, faces, deviation["vertex_deviation_b"], "Deviation from original"))
+                p.daemon = True
+                p.start()
+
+            except Exception as e:
+                status_var.set("❌ Deviation analysis failed")
+                messagebox.showerror("Error", f"Deviation analysis failed:\n{e}")
+
+        threading.Thread(target=run_deviation, daemon=True).start()
+
+    def voxelize_gui():
+        if app_state["mesh"] is None:
+            messagebox.showwarning("No Data", "Please build the structure first.")
+            return
+
+        import tkinter.simpledialog as sd
+        points, faces = current_arrays()
+        extent = float((points.max(axis=0) - points.min(axis=0)).max())
+        pitch = sd.askfloat("Voxelize Mesh", "Voxel size:", minvalue=extent / 2000, initialvalue=round(extent / 128, 6))
+        if pitch is None:
+            return
+
+        def run_voxelize():
+            try:
+                occupancy, origin, voxel_size = voxelize_mesh(points, faces, pitch=pitch, progress_callback=instrumentation)
+                volume = occupancy.sum() * voxel_size ** 3
+                status_var.set(f"✅ Voxelized: {int(occupancy.sum())} voxels filled")
+                messagebox.showinfo(
+                    "Voxelize Mesh",
+                    f"Grid: {' x '.join(str(d) for d in occupancy.shape)}\n"
+                    f"Filled voxels: {int(occupancy.sum())}\nEnclosed volume: {volume:.6g}"
+                )
+
+                p = Process(target=viewer.plot_voxels, args=(occupancy, origin, voxel_size))
+                p.daemon = True
+                p.start()
+
+            except Exception as e:
+                status_var.set("❌ Voxelization failed")
+                messagebox.showerror("Error", f"Voxelization failed:\n{e}")
+
+        threading.Thread(target=run_voxelize, daemon=True).start()
+
+    def slice_gui():
+        if app_state["mesh"] is None:
+            messagebox.showwarning("No Data", "Please build the structure first.")
+            return
+
+        import tkinter.simpledialog as sd
+        mesh = app_state["mesh"]
+        mesh.sync_from_objects()  # pick up edits made on the object lists
+        height = float(np.ptp(mesh.points[:, 2])) if len(mesh.points) else 0.0
+        layer_height = sd.askfloat("Slice Preview", "Layer height:", minvalue=1e-9, initialvalue=round(height / 100, 6) or 0.2)
+        if layer_height is None:
+            return
+
+        def run_slice():
+            try:
+                layers = slice_mesh(mesh, layer_height=layer_height, progress_callback=instrumentation)
+                refresh_edge_count()
+                contours = sum(len(layer["contours"]) for layer in layers)
+                open_contours = sum(layer["closed"].count(False) for layer in layers)
+                status_var.set(f"✅ Sliced into {len(layers)} layers")
+                messagebox.showinfo(
+                    "Slice Preview",
+                    f"Layers: {len(layers)}\nContours: {contours}\nOpen contours (holes): {open_contours}"
+                )
+
+                p = Process(target=viewer.plot_slices, args=(layers,))
+                p.daemon = True
+                p.start()
+
+            except Exception as e:
+                status_var.set("❌ Slicing failed")
+                messagebox.showerror("Error", f"Slicing failed:\n{e}")
+
+        threading.Thread(target=run_slice, daemon=True).start()
+
     btn_load = tk.Button(root, text="Load STL File", command=load_mesh, height=2, width=20)
     btn_load.pack(expand=True)
 
@@ -0,0 +1,232 @@
+"""
+Batched inside/outside classification, signed distance and voxelization.
+
+Inside-ness comes from the generalized winding number (Jacobson et al. 2013),
+which degrades gracefully on meshes with small holes or cracks: it is ~1
+inside, ~0 outside and ~0.5 across a hole. It is evaluated for millions of
+points with the fast tree approximation of Barill et al. 2018: triangles are
+grouped into an octree, and far-away nodes are replaced by their
+area-weighted normal dipole; only nearby leaves are summed exactly.
+"""
+import os
+
+import numpy as np
+
+from mesh_data_structure import expand_ranges
+from mesh_instrumentation import as_instrumentation
+from mesh_spatial import TriangleGrid, map_chunks, morton_codes
+
+
+def solid_angles(q, a, b, c):
+    """
+    Signed solid angle of each triangle (a, b, c) seen from q, all K x 3
+    (Van Oosterom & Strackee). Positive when q is behind the triangle.
+    """
+    a, b, c = a - q, b - q, c - q
+    la, lb, lc = (np.linalg.norm(v, axis=1) for v in (a, b, c))
+    det = np.einsum("ij,ij->i", a, np.cross(b, c))
+    denom = (la * lb * lc + np.einsum("ij,ij->i", a, b) * lc
+             + np.einsum("ij,ij->i", b, c) * la + np.einsum("ij,ij->i", c, a) * lb)
+    return 2.0 * np.arctan2(det, denom)
+
+
+class WindingTree:
+    """
+    Octree over the triangles of (points, faces) for fast generalized winding numbers.
+    Triangles are sorted by the Morton code of their centroid, so every node is a
+    contiguous range; a node is split into its non-empty octants until it holds at
+    most leaf_size triangles. A node is approximated by its dipole once the query
+    is more than beta times the node radius away from its centre.
+    """
+
+    def __init__(self, points, faces, leaf_size=8, beta=2.0):
+        self.points = np.asarray(points, dtype=float)
+        self.faces = np.asarray(faces, dtype=np.int64)
+        self.beta = beta
+
+        tri = self.points[self.faces]
+        F = len(tri)
+        codes = np.zeros(0, dtype=np.uint64)
+        if F:
+            codes = morton_codes(tri.mean(axis=1))
+            order = np.argsort(codes, kind="stable")
+            tri, codes = tri[order], codes[order]
+        self._a, self._b, self._c = tri[:, 0], tri[:, 1], tri[:, 2]
+        # Area-weighted normals (half the cross product) and centroids.
+        area_normals = 0.5 * np.cross(self._b - self._a, self._c - self._a)
+        areas = np.linalg.norm(area_normals, axis=1)
+        centroids = tri.mean(axis=1)
+
+        # Nodes are appended depth by depth; children of a node are consecutive.
+        starts, ends = [np.zeros(1, dtype=np.int64)], [np.full(1, F, dtype=np.int64)]
+        first_child, n_children = [], []
+        level_starts, level_ends = starts[0], ends[0]
+        n_nodes = 1
+        for depth in range(1, 22):
+            split = (level_ends - level_starts) > leaf_size
+            if not np.any(split):
+                first_child.append(np.zeros(len(level_starts), dtype=np.int64))
+                n_children.append(np.zeros(len(level_starts), dtype=np.int64))
+                break
+            parent_starts, parent_ends = level_starts[split], level_ends[split]
+            # Octant boundaries at this depth that fall strictly inside a node being split.
+            prefix = codes >> np.uint64(3 * (21 - depth))
+            change = np.flatnonzero(prefix[1:] != prefix[:-1]) + 1
+            parent = np.searchsorted(parent_starts, change, side="right") - 1
+            inside = (parent >= 0) & (change < parent_ends[np.maximum(parent, 0)])
+            child_starts = np.sort(np.concatenate([parent_starts, change[inside]]))
+            child_parent = np.searchsorted(parent_starts, child_starts, side="right") - 1
+            next_same = np.append(child_parent[1:] == child_parent[:-1], False)
+            child_ends = np.where(next_same, np.append(child_starts[1:], 0), parent_ends[child_parent])
+
+            count = np.zeros(len(level_starts), dtype=np.int64)
+            count[split] = np.bincount(child_parent, minlength=len(parent_starts))
+            first = np.zeros(len(level_starts), dtype=np.int64)
+            first[split] = n_nodes + np.searchsorted(child_starts, parent_starts)
+            first_child.append(first)
+            n_children.append(count)
+
+            starts.append(child_starts)
+            ends.append(child_ends)
+            level_starts, level_ends = child_starts, child_ends
+            n_nodes += len(child_starts)
+        else:
+            first_child.append(np.zeros(len(level_starts), dtype=np.int64))
+            n_children.append(np.zeros(len(level_starts), dtype=np.int64))
+
+        self.starts = np.concatenate(starts)
+        self.ends = np.concatenate(ends)
+        self.first_child = np.concatenate(first_child)
+        self.n_children = np.concatenate(n_children)
+
+        # Dipole (summed area normal), area-weighted centre and bounding radius per node.
+        self.normal = np.zeros((len(self.starts), 3))
+        self.center = np.zeros((len(self.starts), 3))
+        self.radius = np.zeros(len(self.starts))
+        node = 0
+        for level_starts, level_ends in zip(starts, ends):
+            ids = np.arange(node, node + len(level_starts))
+            node += len(level_starts)
+            keep = level_ends > level_starts
+            ids, level_starts, level_ends = ids[keep], level_starts[keep], level_ends[keep]
+            if len(ids) == 0:
+                continue
+            counts = level_ends - level_starts
+            owner, cover = expand_ranges(level_starts, counts)
+            offsets = np.cumsum(counts) - counts
+            area = np.add.reduceat(areas[cover], offsets)
+            weighted = np.add.reduceat(centroids[cover] * areas[cover, None], offsets, axis=0)
+            plain = np.add.reduceat(centroids[cover], offsets, axis=0) / counts[:, None]
+            center = np.where(area[:, None] > 0, weighted / np.where(area > 0, area, 1.0)[:, None], plain)
+            reach = np.max(np.linalg.norm(tri[cover] - center[owner][:, None, :], axis=2), axis=1)
+            self.normal[ids] = np.add.reduceat(area_normals[cover], offsets, axis=0)
+            self.center[ids] = center
+            self.radius[ids] = np.maximum.reduceat(reach, offsets)
+
+    def _chunk(self, q):
+        """Winding numbers for one chunk of queries."""
+        n = len(q)
+        total = np.zeros(n)
+        if len(self._a) == 0:
+            return total
+        pair_q = np.arange(n)
+        pair_node = np.zeros(n, dtype=np.int64)
+        leaf_q, leaf_node = [], []
+
+        while len(pair_q):
+            diff = self.center[pair_node] - q[pair_q]
+            d2 = np.einsum("ij,ij->i", diff, diff)
+            far = d2 > (self.beta * self.radius[pair_node]) ** 2
+            if np.any(far):
+                dipole = np.einsum("ij,ij->i", diff[far], self.normal[pair_node[far]]) / d2[far] ** 1.5
+                total += np.bincount(pair_q[far], weights=dipole, minlength=n)
+            pair_q, pair_node = pair_q[~far], pair_node[~far]
+
+            leaf = self.n_children[pair_node] == 0
+            leaf_q.append(pair_q[leaf])
+            leaf_node.append(pair_node[leaf])
+            pair_q, pair_node = pair_q[~leaf], pair_node[~leaf]
+            # Descend into the children.
+            counts = self.n_children[pair_node]
+            owner, pair_node = expand_ranges(self.first_child[pair_node], counts)
+            pair_q = pair_q[owner]
+
+        # Near leaves: exact solid angles of their triangles.
+        leaf_q, leaf_node = np.concatenate(leaf_q), np.concatenate(leaf_node)
+        owner, tri = expand_ranges(self.starts[leaf_node], self.ends[leaf_node] - self.starts[leaf_node])
+        pair_q = leaf_q[owner]
+        if len(tri):
+            omega = solid_angles(q[pair_q], self._a[tri], self._b[tri], self._c[tri])
+            total += np.bincount(pair_q, weights=omega, minlength=n)
+        return total / (4.0 * np.pi)
+
+    def winding_numbers(self, queries, chunk_size=4096, workers=None):
+        """Generalized winding number per query point (chunks run on all cores)."""
+        queries = np.asarray(queries, dtype=float).reshape(-1, 3)
+        if len(queries) == 0:
+            return np.zeros(0)
+        return np.concatenate(map_chunks(self._chunk, queries, chunk_size, workers))
+
+
+def classify_points(points, faces, queries, threshold=0.5, tree=None, workers=None):
+    """
+    Inside/outside flags for each query point (True = inside).
+    Returns (inside, winding numbers).
+    """
+    tree = tree or WindingTree(points, faces)
+    winding = tree.winding_numbers(queries, workers=workers)
+    return winding > threshold, winding
+
+
+def signed_distance(points, faces, queries, threshold=0.5, workers=None, progress_callback=None):
+    """
+    Distance from each query to the surface, negative inside the mesh.
+    Returns (signed distances, inside flags).
+    """
+    instr = as_instrumentation(progress_callback)
+    queries = np.asarray(queries, dtype=float).reshape(-1, 3)
+    with instr.stage("Classifying points", total=len(queries)) as stage:
+        inside, _ = classify_points(points, faces, queries, threshold, workers=workers)
+        stage.advance(len(queries))
+    with instr.stage("Measuring distances", total=len(queries)) as stage:
+        distances = TriangleGrid(points, faces).closest_points(queries, workers=workers)[0]
+        stage.advance(len(queries))
+    return np.where(inside, -distances, distances), inside
+
+
+def voxelize_mesh(points, faces, pitch=None, resolution=128, bounds=None, threshold=0.5, workers=None,
+                  batch_size=2**20, progress_callback=None):
+    """
+    Voxelize the solid enclosed by the mesh: a voxel is filled when its centre is inside.
+    pitch: voxel edge length; if None it is chosen so the longest side has resolution voxels.
+    bounds: (min xyz, max xyz) of the grid; defaults to the mesh bounding box.
+    Slabs of voxel centres are classified in batches of about batch_size centres,
+    split into enough chunks to keep every worker busy (workers=None uses all cores).
+    Returns (occupancy bool array nx x ny x nz, origin = centre of voxel (0, 0, 0), pitch).
+    """
+    instr = as_instrumentation(progress_callback)
+    points = np.asarray(points, dtype=float)
+    lo, hi = (points.min(axis=0), points.max(axis=0)) if bounds is None else map(np.asarray, bounds)
+    if pitch is None:
+        pitch = max(float((hi - lo).max()), 1e-12) / resolution
+    dims = np.maximum(np.ceil((hi - lo) / pitch).astype(np.int64), 1)
+    origin = lo + 0.5 * pitch
+
+    with instr.stage("Building winding tree"):
+        tree = WindingTree(points, faces)
+
+    occupancy = np.zeros(tuple(dims), dtype=bool)
+    xs, ys, zs = (origin[k] + pitch * np.arange(dims[k]) for k in range(3))
+    workers = workers or os.cpu_count() or 1
+    with instr.stage("Voxelizing", total=int(dims.prod())) as stage:
+        gy, gz = np.meshgrid(ys, zs, indexing="ij")
+        slabs = max(1, batch_size // gy.size)
+        for start in range(0, len(xs), slabs):
+            x = xs[start:start + slabs]
+            centres = np.column_stack([np.repeat(x, gy.size), np.tile(gy.ravel(), len(x)), np.tile(gz.ravel(), len(x))])
+            # A few chunks per worker, but no larger than the tree's default chunk.
+            chunk_size = min(4096, max(256, -(-len(centres) // (4 * workers))))
+            inside = tree.winding_numbers(centres, chunk_size=chunk_size, workers=workers) > threshold
+            occupancy[start:start + len(x)] = inside.reshape((len(x),) + gy.shape)
+            stage.advance(len(centres))
+    return occupancy, origin, pitch
@@ -1,5 +1,6 @@
 import numpy as np
 import pyvista as pv
+from mesh_instrumentation import as_instrumentation
 
 class Vertex:
     def __init__(self, coords, index):
@@ -34,92 +35,283 @@ class Triangle:
 
         self.normal = normal / norm if norm != 0 else np.array([0, 0, 0])
 
+def group_csr(keys, values, size):
+    """Group values by integer key into CSR form (offsets, values), keeping input order per key."""
+    order = np.argsort(keys, kind="stable")
+    offsets = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys, minlength=size), out=offsets[1:])
+    return offsets, values[order]
+
+
+def expand_ranges(starts, counts):
+    """
+    Concatenate the ranges starts[i] .. starts[i] + counts[i] - 1 (e.g. CSR rows).
+    Returns (owner, index): the range each entry came from and the entry itself.
+    """
+    counts = np.asarray(counts, dtype=np.int64)
+    offsets = np.cumsum(counts) - counts
+    owner = np.repeat(np.arange(len(counts)), counts)
+    return owner, np.repeat(starts - offsets, counts) + np.arange(len(owner))
+
+
+def unit_face_normals(corners):
+    """Unit normal per triangle of an F x 3 x 3 corner array; zero for degenerate faces."""
+    normals = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+    lengths = np.linalg.norm(normals, axis=1)
+    nonzero = lengths > 0
+    normals[nonzero] /= lengths[nonzero, None]
+    return normals
+
+
+class LazyMesh:
+    """
+    Mesh backed by points/faces arrays whose derived structures are computed
+    on first access and memoized. Each cached item lists what it depends on,
+    so invalidate() drops exactly the items that became stale.
+    Computing an item is reported as a stage through the instrumentation.
+    """
+
+    DEPENDENCIES = {
+        "edge_table": ("faces",),
+        "edge_faces": ("edge_table",),
+        "vertex_faces": ("faces",),
+        "face_normals": ("points", "faces"),
+        "vertex_normals": ("face_normals", "vertex_faces"),
+        "boundary_loops": ("faces", "edge_faces"),
+        "objects": ("points", "faces", "edge_table", "edge_faces", "vertex_faces", "face_normals"),
+    }
+
+    def __init__(self, points, faces, progress_callback=None):
+        self.points = points
+        self.faces = faces
+        self.instrumentation = as_instrumentation(progress_callback)
+        self._cache = {}
+
+    def _get(self, name):
+        if name not in self._cache:
+            with self.instrumentation.stage(f"Computing {name.replace('_', ' ')}") as stage:
+                self._cache[name] = getattr(self, f"_compute_{name}")(stage)
+        return self._cache[name]
+
+    def is_computed(self, name):
+        return name in self._cache
+
+    def invalidate(self, name):
+        """Drop every memoized item that depends (directly or not) on name."""
+        stale = {name}
+        changed = True
+        while changed:
+            changed = False
+            for item, deps in self.DEPENDENCIES.items():
+                if item not in stale and stale.intersection(deps):
+                    stale.add(item)
+                    changed = True
+        for item in stale:
+            self._cache.pop(item, None)
+
+    # --- derived structures ---
+
+    @property
+    def edges(self):
+        """E x 2 edge table (v1 < v2), in first-encounter order like the object builder."""
+        return self._get("edge_table")[0]
+
+    @property
+    def face_edges(self):
+        """F x 3 edge index per face; entry k is the edge opposite corner k."""
+        return self._get("edge_table")[1]
+
+    @property
+    def edge_faces(self):
+        """CSR (offsets, face indices) of faces per edge, ascending face order."""
+        return self._get("edge_faces")
+
+    @property
+    def edge_face_count(self):
+        offsets, _ = self.edge_faces
+        return np.diff(offsets)
+
+    @property
+    def vertex_faces(self):
+        """CSR (offsets, face indices) of faces per vertex; row length is the valence."""
+        return self._get("vertex_faces")
+
+    @property
+    def valence(self):
+        offsets, _ = self.vertex_faces
+        return np.diff(offsets)
+
+    @property
+    def face_normals(self):
+        return self._get("face_normals")
+
+    @property
+    def vertex_normals(self):
+        return self._get("vertex_normals")
+
+    @property
+    def boundary_loops(self):
+        """List of vertex index arrays, one per boundary loop, following the face winding."""
+        return self._get("boundary_loops")
+
+    @property
+    def objects(self):
+        """(vertices, edges, triangles) lists of Vertex/Edge/Triangle objects."""
+        return self._get("objects")
+
+    def _compute_edge_table(self, stage):
+        faces = self.faces
+        V = len(self.points)
+        u, v = faces[:, [1, 2, 0]].ravel(), faces[:, [2, 0, 1]].ravel()
+        lo, hi = np.minimum(u, v).astype(np.int64), np.maximum(u, v).astype(np.int64)
+        _, first, inverse = np.unique(lo * V + hi, return_index=True, return_inverse=True)
+        # Renumber edges by first appearance so indices match the loop-based builder.
+        order = np.argsort(first)
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+        edges = np.stack([lo[first[order]], hi[first[order]]], axis=1)
+        face_edges = rank[inverse.reshape(-1)].reshape(-1, 3)
+        stage.advance(len(faces))
+        return edges, face_edges
+
+    def _compute_edge_faces(self, stage):
+        face_edges = self.face_edges
+        face_ids = np.repeat(np.arange(len(face_edges)), 3)
+        stage.advance(len(face_edges))
+        return group_csr(face_edges.ravel(), face_ids, len(self.edges))
+
+    def _compute_vertex_faces(self, stage):
+        face_ids = np.repeat(np.arange(len(self.faces)), 3)
+        stage.advance(len(self.faces))
+        return group_csr(self.faces.ravel(), face_ids, len(self.points))
+
+    def _compute_face_normals(self, stage):
+        normals = unit_face_normals(self.points[self.faces])
+        stage.advance(len(self.faces))
+        return normals
+
+    def _compute_vertex_normals(self, stage):
+        offsets, face_ids = self.vertex_faces
+        counts = np.diff(offsets)
+        sums = np.zeros((len(self.points), 3), dtype=self.face_normals.dtype)
+        np.add.at(sums, np.repeat(np.arange(len(self.points)), counts), self.face_normals[face_ids])
+        norms = np.linalg.norm(sums, axis=1)
+        nonzero = norms > 0
+        sums[nonzero] /= norms[nonzero, None]
+        stage.advance(len(self.points))
+        return sums
+
+    def _compute_boundary_loops(self, stage):
+        counts = self.edge_face_count
+        face_edges = self.face_edges
+        boundary = counts[face_edges] == 1  # F x 3 mask of boundary half-edges
+        f_idx, k = np.nonzero(boundary)
+        starts = self.faces[f_idx, (k + 1) % 3].tolist()
+        ends = self.faces[f_idx, (k + 2) % 3].tolist()
+
+        outgoing = {}
+        for a, b in zip(starts, ends):
+            outgoing.setdefault(a, []).append(b)
+
+        loops = []
+        for a in list(outgoing):
+            while outgoing.get(a):
+                loop = [a]
+                current = outgoing[a].pop()
+                while current != a and outgoing.get(current):
+                    loop.append(current)
+                    current = outgoing[current].pop()
+                loops.append(np.array(loop, dtype=np.int64))
+                stage.advance(len(loop))
+        return loops
+
+    def _compute_objects(self, stage):
+        points = self.points
+        faces = self.faces
+        face_edges = self.face_edges
+        edges_table = self.edges
+        ef_offsets, ef_faces = self.edge_faces
+        vf_offsets, vf_faces = self.vertex_faces
+        normals = self.face_normals
+
+        vertex_faces_list = vf_faces.tolist()
+        vf_offsets_list = vf_offsets.tolist()
+        vertices = []
+        for i in range(len(points)):
+            v = Vertex(coords=points[i], index=i)
+            v.triangle_indices = vertex_faces_list[vf_offsets_list[i]:vf_offsets_list[i + 1]]
+            v.valence = len(v.triangle_indices)
+            vertices.append(v)
+        stage.advance(len(points))
+
+        triangles = []
+        for i, (vids, eids) in enumerate(zip(faces.tolist(), face_edges.tolist())):
+            tri = Triangle(vertex_indices=vids, index=i)
+            tri.edge_indices = eids
+            tri.normal = normals[i]
+            triangles.append(tri)
+        stage.advance(len(faces))
+
+        edge_faces_list = ef_faces.tolist()
+        ef_offsets_list = ef_offsets.tolist()
+        edges = []
+        for i, (v1, v2) in enumerate(edges_table.tolist()):
+            edge = Edge(v1=v1, v2=v2)
+            edge.triangles = edge_faces_list[ef_offsets_list[i]:ef_offsets_list[i + 1]]
+            edges.append(edge)
+        stage.advance(len(edges_table))
+
+        return vertices, edges, triangles
+
+    def sync_from_objects(self):
+        """
+        Pull edited coordinates/triangles back from the object lists into the
+        arrays and invalidate what depends on them (the objects themselves are kept).
+        """
+        if "objects" not in self._cache:
+            return
+        vertices, edges, triangles = self._cache.pop("objects")
+        self.points = np.array([v.coords for v in vertices], dtype=self.points.dtype).reshape(-1, 3)
+        self.faces = np.array([t.vertex_indices for t in triangles], dtype=self.faces.dtype).reshape(-1, 3)
+        self.invalidate("points")
+        self.invalidate("faces")
+        self._cache["objects"] = (vertices, edges, triangles)
+
+
+def remove_unused_vertices(points, faces):
+    """Drop vertices no face refers to and renumber the faces."""
+    used, remapped = np.unique(faces, return_inverse=True)
+    return points[used], remapped.reshape(-1, 3)
+
+
+def mesh_to_arrays(vertices, triangles):
+    """Vertex/Triangle object lists -> (points N x 3, faces M x 3) arrays."""
+    points = np.array([v.coords for v in vertices], dtype=float).reshape(-1, 3)
+    faces = np.array([t.vertex_indices for t in triangles], dtype=np.int64).reshape(-1, 3)
+    return points, faces
+
+
+def load_mesh(file_path, progress_callback=None):
+    """
+    Read an STL file into a LazyMesh. Only the file is read here;
+    topology is built when first used.
+    progress_callback: legacy callable(str) or a mesh_instrumentation.Instrumentation.
+    """
+    instr = as_instrumentation(progress_callback)
+    with instr.stage("Reading STL") as stage:
+        mesh = pv.read(file_path)
+        points = mesh.points
+        faces = mesh.faces.reshape((-1, 4))[:, 1:4]  # assuming triangular mesh
+        stage.add_bytes(points.nbytes + faces.nbytes)
+    return LazyMesh(points, faces, progress_callback=instr)
+
+
 # mesh_data_structure.py
 def build_mesh_from_stl(file_path, progress_callback=None):
-    mesh = pv.read(file_path)
-    points = mesh.points
-    faces = mesh.faces.reshape((-1, 4))[:, 1:4]  # assuming triangular mesh
-
-    total_steps = (
-    len(points) +          # vertex creation
-    len(faces) +           # triangle creation
-    len(faces) +           # edge generation (loop once per triangle)
-    len(faces) * 3 +       # normal computation (once per triangle)
-    len(faces) * 3         # vertex updates (each triangle has 3 vertices)
-    )
-    step = 0
-
-    # Build vertices list
-    vertices = []
-    for i in range(len(points)):
-        vertices.append(Vertex(coords=points[i], index=i))
-        step += 1
-        if i % 100 == 0 and progress_callback:
-            percent = min(100, int((step / total_steps) * 100))
-            progress_callback(f"Building vertices... {percent}%")
-
-    # Build triangles list
-    triangles = []
-    for i, face in enumerate(faces):
-        triangles.append(Triangle(vertex_indices=face.tolist(), index=i))
-        step += 1
-        if i % 100 == 0 and progress_callback:
-            percent = int((step / total_steps) * 100)
-            progress_callback(f"Building triangles... {percent}%")
-
-    # Build edges dict to detect duplicates
-    edge_dict = {}
-    edges = []
-
-    for tri in triangles:
-        vids = tri.vertex_indices
-        edge_vertices = [
-            (vids[1], vids[2]),
-            (vids[2], vids[0]),
-            (vids[0], vids[1]),
-        ]
-        for i, (v_start, v_end) in enumerate(edge_vertices):
-            key = tuple(sorted((v_start, v_end)))
-            if key in edge_dict:
-                edge_index = edge_dict[key]
-                edges[edge_index].triangles.append(tri.index)
-                tri.edge_indices[i] = edge_index
-            else:
-                edge_index = len(edges)
-                edge = Edge(v1=key[0], v2=key[1])
-                edge.triangles.append(tri.index)
-                edges.append(edge)
-                edge_dict[key] = edge_index
-                tri.edge_indices[i] = edge_index
-        step += 1
-    if progress_callback:
-        progress_callback("Building edges...")
-
-    # Update valence and triangle indices in vertices
-    for tri in triangles:
-        for v_idx in tri.vertex_indices:
-            vertices[v_idx].valence += 1
-            vertices[v_idx].triangle_indices.append(tri.index)
-        step += 1
-    if progress_callback:
-        progress_callback("Assigning triangle refs...")
-
-    # Compute triangle normals
-    for tri in triangles:
-        p0 = vertices[tri.vertex_indices[0]].coords
-        p1 = vertices[tri.vertex_indices[1]].coords
-        p2 = vertices[tri.vertex_indices[2]].coords
-        edge1 = p1 - p0
-        edge2 = p2 - p0
-        n = np.cross(edge1, edge2)
-        norm = np.linalg.norm(n)
-        tri.normal = n / norm if norm > 0 else np.array([0,0,0])
-        step += 1
-        if step % 200 == 0 and progress_callback:
-            percent = int((step / total_steps) * 100)
-            progress_callback(f"Computing normals... {percent}%")
-
-    if progress_callback:
-        progress_callback("✅ Structure complete (100%)")
-
-    return vertices, edges, triangles
\ No newline at end of file
+    """
+    Read an STL file and build the vertex/edge/triangle structure.
+    progress_callback: legacy callable(str) or a mesh_instrumentation.Instrumentation.
+    """
+    instr = as_instrumentation(progress_callback)
+    with instr.stage("Building data structure"):
+        return load_mesh(file_path, progress_callback=instr).objects
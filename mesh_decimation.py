@@ -0,0 +1,284 @@
+import numpy as np
+from mesh_data_structure import remove_unused_vertices
+from mesh_instrumentation import as_instrumentation
+from mesh_topology import MeshTopology, claim_independent, collapse_allowed, expand_rows, priority_rank
+
+
+def _plane_quadrics(normals, offsets, weights=None):
+    """Build 4x4 quadrics K = w * p p^T for planes p = [n, d]."""
+    planes = np.hstack([normals, offsets[:, None]])
+    quadrics = np.einsum("ni,nj->nij", planes, planes)
+    if weights is not None:
+        quadrics *= weights[:, None, None]
+    return quadrics
+
+
+def _unique_edges(faces):
+    """
+    Return (edges Ex2 sorted, face index per half-edge, edge index per half-edge, count per edge).
+    Half-edges are ordered (0,1), (1,2), (2,0) for each face.
+    """
+    half_edges = faces[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2)
+    half_edges = np.sort(half_edges, axis=1)
+    edges, inverse, counts = np.unique(half_edges, axis=0, return_inverse=True, return_counts=True)
+    face_of_half = np.repeat(np.arange(len(faces)), 3)
+    return edges, face_of_half, inverse.reshape(-1), counts
+
+
+def compute_vertex_quadrics(points, faces, boundary_weight=1000.0, feature_angle=None):
+    """
+    Compute one error quadric per vertex.
+    Boundary edges (and feature edges sharper than feature_angle degrees)
+    get extra perpendicular constraint planes so they are preserved.
+    Returns (quadrics Nx4x4, boundary vertex mask).
+    """
+    V = len(points)
+    p0, p1, p2 = points[faces[:, 0]], points[faces[:, 1]], points[faces[:, 2]]
+    normals = np.cross(p1 - p0, p2 - p0)
+    lengths = np.linalg.norm(normals, axis=1)
+    valid = lengths > 0
+    normals[valid] /= lengths[valid, None]
+    normals[~valid] = 0.0
+    offsets = -np.einsum("ij,ij->i", normals, p0)
+
+    face_quadrics = _plane_quadrics(normals, offsets)
+    quadrics = np.zeros((V, 4, 4))
+    for k in range(3):
+        np.add.at(quadrics, faces[:, k], face_quadrics)
+
+    edges, face_of_half, edge_of_half, counts = _unique_edges(faces)
+    is_boundary = np.zeros(V, dtype=bool)
+
+    # Constraint planes: one per (edge, adjacent face) pair to keep.
+    constrained = counts[edge_of_half] == 1
+    is_boundary[edges[counts == 1].ravel()] = True
+
+    if feature_angle is not None:
+        interior = np.flatnonzero(counts == 2)
+        order = np.argsort(edge_of_half, kind="stable")
+        starts = np.searchsorted(edge_of_half[order], interior)
+        fa = face_of_half[order[starts]]
+        fb = face_of_half[order[starts + 1]]
+        dots = np.clip(np.einsum("ij,ij->i", normals[fa], normals[fb]), -1.0, 1.0)
+        sharp = np.degrees(np.arccos(dots)) > feature_angle
+        constrained |= np.isin(edge_of_half, interior[sharp])
+
+    if np.any(constrained):
+        half = np.flatnonzero(constrained)
+        f_idx = face_of_half[half]
+        local = half % 3
+        a = faces[f_idx, local]
+        b = faces[f_idx, (local + 1) % 3]
+        direction = points[b] - points[a]
+        perp = np.cross(direction, normals[f_idx])
+        perp_len = np.linalg.norm(perp, axis=1)
+        ok = perp_len > 0
+        perp = perp[ok] / perp_len[ok, None]
+        a, b = a[ok], b[ok]
+        weights = boundary_weight * np.einsum("ij,ij->i", direction[ok], direction[ok])
+        constraint = _plane_quadrics(perp, -np.einsum("ij,ij->i", perp, points[a]), weights)
+        np.add.at(quadrics, a, constraint)
+        np.add.at(quadrics, b, constraint)
+
+    return quadrics, is_boundary
+
+
+def _collapse_targets(Q, pa, pb):
+    """
+    Vectorized optimal placement for a batch of edge collapses.
+    Q: Kx4x4 combined quadrics, pa/pb: Kx3 endpoints.
+    Returns (targets Kx3, costs K).
+    """
+    K = len(Q)
+    candidates = np.stack([pa, pb, 0.5 * (pa + pb)], axis=1)  # K x 3 x 3
+
+    A = Q[:, :3, :3]
+    rhs = -Q[:, :3, 3]
+    det = np.linalg.det(A)
+    solvable = np.abs(det) > 1e-12
+    optimal = candidates[:, 2].copy()
+    if np.any(solvable):
+        optimal[solvable] = np.linalg.solve(A[solvable], rhs[solvable][..., None])[..., 0]
+    candidates = np.concatenate([candidates, optimal[:, None]], axis=1)  # K x 4 x 3
+
+    homogeneous = np.concatenate([candidates, np.ones((K, 4, 1))], axis=2)
+    costs = np.einsum("kci,kij,kcj->kc", homogeneous, Q, homogeneous)
+    costs[~solvable, 3] = np.inf
+    best = np.argmin(costs, axis=1)
+    rows = np.arange(K)
+    return candidates[rows, best], np.maximum(costs[rows, best], 0.0)
+
+
+def _stars(topo, a, b):
+    """(candidate, face) pairs for every face around either endpoint of each candidate edge."""
+    owner_a, f_a = expand_rows(*topo.vertex_faces, a)
+    owner_b, f_b = expand_rows(*topo.vertex_faces, b)
+    return np.concatenate([owner_a, owner_b]), np.concatenate([f_a, f_b])
+
+
+def decimate_mesh(points, faces, target_faces=None, max_error=None, preserve_boundary=True,
+                  feature_angle=None, boundary_weight=1000.0, seed=0, claim_passes=3, chunk_size=200_000,
+                  progress_callback=None):
+    """
+    Quadric-error edge-collapse decimation on array meshes.
+    Works in rounds: among the cheaper half of the edges, collapses with
+    disjoint face stars are picked and applied at once, cheapest first.
+    Rounds stop when the face count reaches target_faces or every remaining
+    collapse would exceed max_error (squared distance to the original planes).
+    Collapses that violate the link condition or flip a face are rejected, so a
+    manifold input stays manifold.
+    Returns (points, faces) of the simplified mesh.
+    """
+    points = np.array(points, dtype=float).reshape(-1, 3)
+    faces = np.array(faces, dtype=np.int64).reshape(-1, 3)
+    if target_faces is None and max_error is None:
+        raise ValueError("Either target_faces or max_error must be given.")
+    if target_faces is None:
+        target_faces = 0
+
+    instr = as_instrumentation(progress_callback)
+
+    with instr.stage("Computing quadrics", total=len(faces)) as stage:
+        quadrics, _ = compute_vertex_quadrics(
+            points, faces,
+            boundary_weight=boundary_weight if preserve_boundary else 0.0,
+            feature_angle=feature_angle,
+        )
+        stage.advance(len(faces))
+
+    rng = np.random.default_rng(seed)
+    initial_faces = len(faces)
+    with instr.stage("Collapsing edges", total=max(0, initial_faces - target_faces)) as stage:
+        while len(faces) > target_faces:
+            topo = MeshTopology(faces, len(points))
+            cand = np.flatnonzero(topo.counts <= 2)
+            # An interior edge joining two boundary vertices would pinch the surface.
+            a, b = topo.edges[cand, 0], topo.edges[cand, 1]
+            cand = cand[~(topo.locked[a] & topo.locked[b] & (topo.counts[cand] == 2))]
+            if len(cand) == 0:
+                break
+
+            targets = np.empty((len(cand), 3))
+            costs = np.empty(len(cand))
+            for start in range(0, len(cand), chunk_size):
+                part = cand[start:start + chunk_size]
+                pa, pb = topo.edges[part, 0], topo.edges[part, 1]
+                targets[start:start + chunk_size], costs[start:start + chunk_size] = _collapse_targets(
+                    quadrics[pa] + quadrics[pb], points[pa], points[pb]
+                )
+            keep = costs <= np.median(costs)
+            if max_error is not None:
+                keep &= costs <= max_error
+            cand, targets, costs = cand[keep], targets[keep], costs[keep]
+
+            a, b = topo.edges[cand, 0], topo.edges[cand, 1]
+
+            # Collapses are picked in a random order rather than by cost: in flat
+            # regions the costs are nearly equal, and cost order would let only a
+            # handful of local minima win per round. Winners are checked for
+            # validity afterwards; later passes fill in around the accepted ones.
+            rank = priority_rank(rng.random(len(cand)))
+            owner, slot = _stars(topo, a, b)
+            taken = np.zeros(len(faces), dtype=bool)
+            pool = np.ones(len(cand), dtype=bool)
+            accepted = []
+            for _ in range(claim_passes):
+                pool &= np.bincount(owner[taken[slot]], minlength=len(cand)) == 0
+                if not np.any(pool):
+                    break
+                in_pool = pool[owner]
+                won = claim_independent(owner[in_pool], slot[in_pool], rank, len(faces)) & pool
+                winners = np.flatnonzero(won)
+                ok = np.ones(len(winners), dtype=bool)
+                for start in range(0, len(winners), chunk_size):
+                    part = winners[start:start + chunk_size]
+                    ok[start:start + chunk_size] = collapse_allowed(
+                        points, faces, topo, cand[part], a[part], b[part], targets[part], np.inf
+                    )
+                accepted.append(winners[ok])
+                won[winners[~ok]] = False
+                taken[slot[won[owner]]] = True
+                pool[winners] = False
+            selected = np.concatenate(accepted) if accepted else np.zeros(0, dtype=np.int64)
+            if len(selected) == 0:
+                break
+
+            # Do not overshoot target_faces: take the cheapest winners that fit.
+            selected = selected[np.argsort(costs[selected], kind="stable")]
+            removed = np.cumsum(topo.counts[cand[selected]])
+            selected = selected[:max(1, np.searchsorted(removed, len(faces) - target_faces, side="right"))]
+            a, b = a[selected], b[selected]
+
+            points[a] = targets[selected]
+            quadrics[a] += quadrics[b]
+            remap = np.arange(len(points))
+            remap[b] = a
+            faces = remap[faces]
+            before = len(faces)
+            faces = faces[(faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) & (faces[:, 2] != faces[:, 0])]
+            stage.advance(before - len(faces))
+
+    # Compact the result.
+    points, faces = remove_unused_vertices(points, faces)
+    instr.message(f"Decimation complete: {initial_faces} -> {len(faces)} faces")
+    return points, faces
+
+
+def cluster_vertices(points, faces, target_faces):
+    """
+    Fast, low-quality simplification by vertex clustering: vertices are
+    merged per cell of a uniform grid sized so that roughly target_faces
+    remain, each cluster moving to its mean. Faces that collapse or repeat
+    are dropped; the result need not be manifold, so use it as a preview.
+    Returns (points, faces).
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 3)
+    faces = np.asarray(faces, dtype=np.int64).reshape(-1, 3)
+    if len(faces) <= target_faces:
+        return points, faces
+    tri = points[faces]
+    area = 0.5 * np.linalg.norm(np.cross(tri[:, 1] - tri[:, 0], tri[:, 2] - tri[:, 0]), axis=1).sum()
+    # A closed surface has about two faces per vertex, one vertex per occupied cell.
+    cell = np.sqrt(2.0 * area / max(target_faces, 1))
+    if cell <= 0:
+        return points, faces
+
+    lo = points.min(axis=0)
+    ijk = np.floor((points - lo) / cell).astype(np.int64)
+    dims = ijk.max(axis=0) + 1
+    keys = (ijk[:, 0] * dims[1] + ijk[:, 1]) * dims[2] + ijk[:, 2]
+    _, cluster = np.unique(keys, return_inverse=True)
+    cluster = cluster.reshape(-1)
+    counts = np.bincount(cluster)
+    centers = np.stack([np.bincount(cluster, weights=points[:, k]) for k in range(3)], axis=1) / counts[:, None]
+
+    faces = cluster[faces]
+    faces = faces[(faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) & (faces[:, 2] != faces[:, 0])]
+    # Drop duplicates, keeping the first face of each vertex set.
+    C = len(centers)
+    s = np.sort(faces, axis=1)
+    _, first = np.unique((s[:, 0] * C + s[:, 1]) * C + s[:, 2], return_index=True)
+    faces = faces[np.sort(first)]
+    return remove_unused_vertices(centers, faces)
+
+
+def build_lod_proxies(points, faces, ratios=(0.25, 0.05, 0.01), min_faces=100, progress_callback=None):
+    """
+    Build a list of level-of-detail proxies, finest first.
+    Each level is decimated from the previous one, so coarse levels are cheap.
+    Returns list of (points, faces) tuples.
+    """
+    instr = as_instrumentation(progress_callback)
+    levels = []
+    total = len(faces)
+    current_points, current_faces = points, faces
+    for ratio in sorted(ratios, reverse=True):
+        target = max(int(total * ratio), min_faces)
+        if target >= len(current_faces):
+            continue
+        with instr.stage(f"Building LOD {len(levels) + 1} ({target} faces)"):
+            current_points, current_faces = decimate_mesh(
+                current_points, current_faces, target_faces=target, progress_callback=instr
+            )
+        levels.append((current_points, current_faces))
+    return levels
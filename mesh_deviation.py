@@ -0,0 +1,186 @@
+"""
+Deviation analysis between two triangle meshes, e.g. before and after
+smoothing, beautifying or hole filling.
+
+Both surfaces are sampled (area-weighted) and the samples, together with
+the mesh vertices, are queried in bulk against a TriangleGrid of the
+other mesh. From the distances we report one-sided and symmetric
+Hausdorff distance, mean and RMS deviation, and per-vertex deviation
+scalars that the viewer can colour-map.
+"""
+import numpy as np
+
+from mesh_data_structure import unit_face_normals
+from mesh_instrumentation import as_instrumentation
+from mesh_spatial import TriangleGrid
+
+
+def sample_surface(points, faces, n_samples, seed=0):
+    """
+    Draw n_samples points uniformly over the surface (area-weighted).
+    Returns (samples n x 3, face index of each sample).
+    """
+    points = np.asarray(points, dtype=float)
+    faces = np.asarray(faces, dtype=np.int64)
+    if n_samples <= 0 or len(faces) == 0:
+        return np.zeros((0, 3)), np.zeros(0, dtype=np.int64)
+    a, b, c = points[faces[:, 0]], points[faces[:, 1]], points[faces[:, 2]]
+    areas = 0.5 * np.linalg.norm(np.cross(b - a, c - a), axis=1)
+    total = areas.sum()
+    if total <= 0:
+        return np.zeros((0, 3)), np.zeros(0, dtype=np.int64)
+
+    rng = np.random.default_rng(seed)
+    face_ids = np.searchsorted(np.cumsum(areas), rng.random(n_samples) * total, side="right")
+    face_ids = np.minimum(face_ids, len(faces) - 1)
+    # Uniform barycentric coordinates: reflect (u, v) back into the triangle.
+    u, v = rng.random(n_samples), rng.random(n_samples)
+    flip = u + v > 1
+    u[flip], v[flip] = 1 - u[flip], 1 - v[flip]
+    samples = a[face_ids] + (b - a)[face_ids] * u[:, None] + (c - a)[face_ids] * v[:, None]
+    return samples, face_ids
+
+
+def pseudonormals(points, faces):
+    """
+    Angle-weighted pseudonormals (Baerentzen & Aanaes, 2005), which give the
+    correct inside/outside sign also when the closest point is on an edge or
+    a vertex. Returns (face normals F x 3, edge normals F x 3 x 3 for the edge
+    opposite each corner, vertex normals V x 3).
+    """
+    points = np.asarray(points, dtype=float)
+    faces = np.asarray(faces, dtype=np.int64)
+    face_normals = unit_face_normals(points[faces])
+
+    tri = points[faces]
+    angles = np.empty((len(faces), 3))
+    for k in range(3):
+        u = tri[:, (k + 1) % 3] - tri[:, k]
+        v = tri[:, (k + 2) % 3] - tri[:, k]
+        angles[:, k] = np.arctan2(np.linalg.norm(np.cross(u, v), axis=1), np.einsum("ij,ij->i", u, v))
+    weighted = (angles[:, :, None] * face_normals[:, None, :]).reshape(-1, 3)
+    vertex_normals = np.stack(
+        [np.bincount(faces.ravel(), weights=weighted[:, k], minlength=len(points)) for k in range(3)], axis=1
+    )
+
+    V = len(points)
+    lo = np.minimum(faces[:, [1, 2, 0]], faces[:, [2, 0, 1]]).ravel()
+    hi = np.maximum(faces[:, [1, 2, 0]], faces[:, [2, 0, 1]]).ravel()
+    _, edge_of_half = np.unique(lo * V + hi, return_inverse=True)
+    edge_of_half = edge_of_half.reshape(-1)
+    per_half = np.repeat(face_normals, 3, axis=0)
+    sums = np.stack([np.bincount(edge_of_half, weights=per_half[:, k]) for k in range(3)], axis=1)
+    edge_normals = sums[edge_of_half].reshape(-1, 3, 3)
+    return face_normals, edge_normals, vertex_normals
+
+
+def signed_distances(grid, queries, normals=None, tolerance=1e-9):
+    """
+    Distance from each query to the surface of grid, positive in front of the
+    surface. The side is taken from the pseudonormal of the face, edge or
+    vertex the closest point lies on; normals takes a precomputed
+    pseudonormals() result for grid.
+    """
+    queries = np.asarray(queries, dtype=float)
+    distances, closest, face_ids = grid.closest_points(queries)
+    if normals is None:
+        normals = pseudonormals(grid.points, grid.faces)
+    face_normals, edge_normals, vertex_normals = normals
+
+    # Barycentric coordinates of the closest point tell which feature it is on.
+    tri = grid.points[grid.faces[face_ids]]
+    v0, v1, v2 = tri[:, 1] - tri[:, 0], tri[:, 2] - tri[:, 0], closest - tri[:, 0]
+    d00, d01, d11 = (np.einsum("ij,ij->i", x, y) for x, y in ((v0, v0), (v0, v1), (v1, v1)))
+    d20, d21 = np.einsum("ij,ij->i", v2, v0), np.einsum("ij,ij->i", v2, v1)
+    denom = d00 * d11 - d01 * d01
+    denom = np.where(denom == 0, 1.0, denom)
+    bary = np.empty((len(queries), 3))
+    bary[:, 1] = (d11 * d20 - d01 * d21) / denom
+    bary[:, 2] = (d00 * d21 - d01 * d20) / denom
+    bary[:, 0] = 1.0 - bary[:, 1] - bary[:, 2]
+    on_zero = bary <= tolerance
+    zeros = on_zero.sum(axis=1)
+
+    n = face_normals[face_ids]
+    on_edge = zeros == 1
+    corner = np.argmax(on_zero, axis=1)  # the edge opposite the zero coordinate
+    n[on_edge] = edge_normals[face_ids[on_edge], corner[on_edge]]
+    on_vertex = zeros >= 2
+    corner = np.argmax(bary, axis=1)
+    n[on_vertex] = vertex_normals[grid.faces[face_ids[on_vertex], corner[on_vertex]]]
+
+    side = np.einsum("ij,ij->i", queries - closest, n)
+    return np.where(side < 0, -distances, distances)
+
+
+def _one_sided(source_points, source_faces, grid, n_samples, seed, signed):
+    """Distances from the samples and vertices of the source mesh to grid's surface."""
+    samples, _ = sample_surface(source_points, source_faces, n_samples, seed=seed)
+    queries = np.vstack([np.asarray(source_points, dtype=float).reshape(-1, 3), samples])
+    if signed:
+        d = signed_distances(grid, queries)
+    else:
+        d = grid.closest_points(queries)[0]
+    vertex_deviation = d[:len(source_points)]
+    d = np.abs(d)
+    return {
+        "hausdorff": float(d.max()) if len(d) else 0.0,
+        "mean": float(d.mean()) if len(d) else 0.0,
+        "rms": float(np.sqrt(np.mean(d ** 2))) if len(d) else 0.0,
+        "count": len(d),
+    }, vertex_deviation
+
+
+def compare_meshes(points_a, faces_a, points_b, faces_b, samples=None, signed=False, seed=0,
+                   progress_callback=None):
+    """
+    Compare mesh A with mesh B.
+    samples: surface samples per mesh (defaults to the face count, at least 10000).
+    signed: per-vertex deviations carry the side of the other surface they lie on.
+    Returns a dict with hausdorff_ab, hausdorff_ba, hausdorff, mean_ab, mean_ba, mean,
+    rms_ab, rms_ba, rms and per-vertex deviation scalars vertex_deviation_a / vertex_deviation_b.
+    """
+    instr = as_instrumentation(progress_callback)
+    points_a = np.asarray(points_a, dtype=float)
+    points_b = np.asarray(points_b, dtype=float)
+    faces_a = np.asarray(faces_a, dtype=np.int64)
+    faces_b = np.asarray(faces_b, dtype=np.int64)
+
+    with instr.stage("Building spatial indices", total=len(faces_a) + len(faces_b)) as stage:
+        grid_a = TriangleGrid(points_a, faces_a)
+        stage.advance(len(faces_a))
+        grid_b = TriangleGrid(points_b, faces_b)
+        stage.advance(len(faces_b))
+
+    n_a = samples if samples is not None else max(len(faces_a), 10000)
+    n_b = samples if samples is not None else max(len(faces_b), 10000)
+    with instr.stage("Measuring deviation A -> B", total=len(points_a) + n_a) as stage:
+        ab, vertex_a = _one_sided(points_a, faces_a, grid_b, n_a, seed, signed)
+        stage.advance(ab["count"])
+    with instr.stage("Measuring deviation B -> A", total=len(points_b) + n_b) as stage:
+        ba, vertex_b = _one_sided(points_b, faces_b, grid_a, n_b, seed + 1, signed)
+        stage.advance(ba["count"])
+
+    total = ab["count"] + ba["count"]
+    return {
+        "hausdorff_ab": ab["hausdorff"],
+        "hausdorff_ba": ba["hausdorff"],
+        "hausdorff": max(ab["hausdorff"], ba["hausdorff"]),
+        "mean_ab": ab["mean"],
+        "mean_ba": ba["mean"],
+        "mean": (ab["mean"] * ab["count"] + ba["mean"] * ba["count"]) / total if total else 0.0,
+        "rms_ab": ab["rms"],
+        "rms_ba": ba["rms"],
+        "rms": float(np.sqrt((ab["rms"] ** 2 * ab["count"] + ba["rms"] ** 2 * ba["count"]) / total)) if total else 0.0,
+        "vertex_deviation_a": vertex_a,
+        "vertex_deviation_b": vertex_b,
+    }
+
+
+def format_deviation_report(report):
+    """One-line-per-metric summary of a compare_meshes result."""
+    return "\n".join([
+        f"Hausdorff: {report['hausdorff']:.6g} (A->B {report['hausdorff_ab']:.6g}, B->A {report['hausdorff_ba']:.6g})",
+        f"Mean deviation: {report['mean']:.6g} (A->B {report['mean_ab']:.6g}, B->A {report['mean_ba']:.6g})",
+        f"RMS deviation: {report['rms']:.6g} (A->B {report['rms_ab']:.6g}, B->A {report['rms_ba']:.6g})",
+    ])
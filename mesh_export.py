@@ -1,58 +1,55 @@
 import numpy as np
 from stl import mesh as numpy_stl_mesh 
 import json
+from mesh_instrumentation import as_instrumentation
 
 def save_mesh_to_json(vertices, edges, triangles, filename="mesh_data.json", progress_callback=None):
+    """progress_callback: legacy callable(str) or a mesh_instrumentation.Instrumentation."""
+    instr = as_instrumentation(progress_callback)
     data = {
         "vertices": [],
         "edges": [],
         "triangles": []
     }
 
-    total_steps = 3
-    current_step = 0
+    with instr.stage("Exporting JSON"):
+        # Process vertices
+        with instr.stage("Serializing vertices", total=len(vertices)) as stage:
+            for v in vertices:
+                data["vertices"].append({
+                    "index": v.index,
+                    "coords": v.coords.tolist(),
+                    "valence": v.valence,
+                    "normal": v.normal.tolist() if v.normal is not None else None,
+                    "triangle_indices": v.triangle_indices
+                })
+                stage.advance()
 
-    # Process vertices
-    for v in vertices:
-        data["vertices"].append({
-            "index": v.index,
-            "coords": v.coords.tolist(),
-            "valence": v.valence,
-            "normal": v.normal.tolist() if v.normal is not None else None,
-            "triangle_indices": v.triangle_indices
-        })
-    current_step += 1
-    if progress_callback:
-        progress_callback(int(current_step / total_steps * 100))
+        # Process edges
+        with instr.stage("Serializing edges", total=len(edges)) as stage:
+            for e in edges:
+                data["edges"].append({
+                    "v1": e.v1,
+                    "v2": e.v2,
+                    "triangles": e.triangles
+                })
+                stage.advance()
 
-    # Process edges
-    for e in edges:
-        data["edges"].append({
-            "v1": e.v1,
-            "v2": e.v2,
-            "triangles": e.triangles
-        })
-    current_step += 1
-    if progress_callback:
-        progress_callback(int(current_step / total_steps * 100))
+        # Process triangles
+        with instr.stage("Serializing triangles", total=len(triangles)) as stage:
+            for t in triangles:
+                data["triangles"].append({
+                    "index": t.index,
+                    "vertex_indices": t.vertex_indices,
+                    "edge_indices": t.edge_indices,
+                    "normal": t.normal.tolist() if t.normal is not None else None
+                })
+                stage.advance()
 
-    # Process triangles
-    for t in triangles:
-        data["triangles"].append({
-            "index": t.index,
-            "vertex_indices": t.vertex_indices,
-            "edge_indices": t.edge_indices,
-            "normal": t.normal.tolist() if t.normal is not None else None
-        })
-    current_step += 1
-    if progress_callback:
-        progress_callback(int(current_step / total_steps * 100))
-
-    with open(filename, "w") as f:
-        json.dump(data, f, indent=2)
-
-    if progress_callback:
-        progress_callback(100)
+        with instr.stage("Writing file") as stage:
+            with open(filename, "w") as f:
+                json.dump(data, f, indent=2)
+                stage.add_bytes(f.tell())
 
     print(f"✅ Mesh data saved to {filename}")
 
@@ -73,4 +70,12 @@ def save_mesh_to_stl(vertices, triangles, filename):
 
     mesh = numpy_stl_mesh.Mesh(stl_data)
     mesh.save(filename)
-    print(f"✅ STL file saved to {filename}")
\ No newline at end of file
+    print(f"✅ STL file saved to {filename}")
+
+def save_arrays_to_stl(points, faces, filename):
+    """Write (points Nx3, faces Mx3) numpy arrays straight to a binary STL file."""
+    stl_data = np.zeros(len(faces), dtype=numpy_stl_mesh.Mesh.dtype)
+    stl_data["vectors"] = np.asarray(points)[np.asarray(faces)]
+    mesh = numpy_stl_mesh.Mesh(stl_data)
+    mesh.update_normals()
+    mesh.save(filename)
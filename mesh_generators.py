@@ -0,0 +1,130 @@
+import numpy as np
+
+from mesh_data_structure import remove_unused_vertices
+
+# Deterministic synthetic meshes for benchmarks and experiments.
+# Every generator returns (points Nx3 float, faces Mx3 int) numpy arrays.
+
+
+def _icosahedron():
+    t = (1.0 + np.sqrt(5.0)) / 2.0
+    points = np.array([
+        [-1, t, 0], [1, t, 0], [-1, -t, 0], [1, -t, 0],
+        [0, -1, t], [0, 1, t], [0, -1, -t], [0, 1, -t],
+        [t, 0, -1], [t, 0, 1], [-t, 0, -1], [-t, 0, 1],
+    ], dtype=float)
+    faces = np.array([
+        [0, 11, 5], [0, 5, 1], [0, 1, 7], [0, 7, 10], [0, 10, 11],
+        [1, 5, 9], [5, 11, 4], [11, 10, 2], [10, 7, 6], [7, 1, 8],
+        [3, 9, 4], [3, 4, 2], [3, 2, 6], [3, 6, 8], [3, 8, 9],
+        [4, 9, 5], [2, 4, 11], [6, 2, 10], [8, 6, 7], [9, 8, 1],
+    ], dtype=np.int64)
+    return points / np.linalg.norm(points, axis=1)[:, None], faces
+
+
+def icosphere(target_faces=10000, radius=1.0):
+    """
+    Geodesic sphere with roughly target_faces faces (20 * n^2 for frequency n).
+    """
+    n = max(1, int(round(np.sqrt(target_faces / 20.0))))
+    base_points, base_faces = _icosahedron()
+
+    # Barycentric grid shared by all 20 base faces.
+    i, j = np.meshgrid(np.arange(n + 1), np.arange(n + 1), indexing="ij")
+    mask = i + j <= n
+    i, j = i[mask], j[mask]
+    local = -np.ones((n + 1, n + 1), dtype=np.int64)
+    local[i, j] = np.arange(len(i))
+
+    ui, uj = np.nonzero((np.add.outer(np.arange(n + 1), np.arange(n + 1)) < n))
+    up = np.stack([local[ui, uj], local[ui + 1, uj], local[ui, uj + 1]], axis=1)
+    di, dj = np.nonzero((np.add.outer(np.arange(n + 1), np.arange(n + 1)) < n - 1))
+    down = np.stack([local[di + 1, dj], local[di + 1, dj + 1], local[di, dj + 1]], axis=1)
+    grid_faces = np.vstack([up, down])
+
+    # Canonical integer key per grid point so points on shared base edges weld exactly.
+    weights = np.stack([n - i - j, i, j], axis=1)                       # P x 3
+    vids = base_faces[:, None, :].repeat(len(i), axis=1)                # 20 x P x 3
+    w = np.broadcast_to(weights, vids.shape)
+    vids = np.where(w > 0, vids, -1)
+    order = np.argsort(vids, axis=2)
+    vids = np.take_along_axis(vids, order, axis=2)
+    w = np.take_along_axis(w, order, axis=2)
+    base = 13 * (n + 1)
+    terms = (vids + 1) * (n + 1) + w
+    keys = (terms[..., 0] * base + terms[..., 1]) * base + terms[..., 2]
+
+    keys = keys.reshape(-1)
+    unique_keys, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+
+    corner = base_points[base_faces]                                     # 20 x 3 x 3
+    all_points = np.einsum("pk,fkd->fpd", weights / n, corner).reshape(-1, 3)
+    points = all_points[first]
+    points = radius * points / np.linalg.norm(points, axis=1)[:, None]
+
+    offsets = (np.arange(20) * len(i))[:, None, None]
+    faces = inverse.reshape(-1)[(grid_faces[None, :, :] + offsets).reshape(-1, 3)]
+    return points, faces
+
+
+def torus(target_faces=10000, major_radius=1.0, minor_radius=0.3):
+    """Closed torus with roughly target_faces faces (2 * nu * nv)."""
+    nu = max(3, int(round(np.sqrt(target_faces / 2.0 * major_radius / minor_radius))))
+    nv = max(3, int(round(target_faces / (2.0 * nu))))
+    u = np.arange(nu) * 2 * np.pi / nu
+    v = np.arange(nv) * 2 * np.pi / nv
+    uu, vv = np.meshgrid(u, v, indexing="ij")
+    ring = major_radius + minor_radius * np.cos(vv)
+    points = np.stack([ring * np.cos(uu), ring * np.sin(uu), minor_radius * np.sin(vv)], axis=-1).reshape(-1, 3)
+
+    a_i, a_j = np.meshgrid(np.arange(nu), np.arange(nv), indexing="ij")
+    b_i, b_j = (a_i + 1) % nu, (a_j + 1) % nv
+    a = (a_i * nv + a_j).ravel()
+    b = (b_i * nv + a_j).ravel()
+    c = (b_i * nv + b_j).ravel()
+    d = (a_i * nv + b_j).ravel()
+    faces = np.vstack([np.stack([a, b, c], axis=1), np.stack([a, c, d], axis=1)])
+    return points, faces
+
+
+def noisy_scan(target_faces=10000, noise=0.2, holes=5, hole_radius=0.15, seed=0):
+    """
+    Icosphere with radial noise (as a fraction of the mean edge length)
+    and a number of circular holes cut out, like a raw scan.
+    """
+    rng = np.random.default_rng(seed)
+    points, faces = icosphere(target_faces)
+    edge_length = np.linalg.norm(points[faces[:, 0]] - points[faces[:, 1]], axis=1).mean()
+    points = points * (1.0 + noise * edge_length * rng.standard_normal(len(points)))[:, None]
+
+    centroids = points[faces].mean(axis=1)
+    centroids /= np.linalg.norm(centroids, axis=1)[:, None]
+    keep = np.ones(len(faces), dtype=bool)
+    centers = rng.standard_normal((holes, 3))
+    centers /= np.linalg.norm(centers, axis=1)[:, None]
+    for center in centers:
+        keep &= centroids @ center < np.cos(hole_radius)
+    return remove_unused_vertices(points, faces[keep])
+
+
+def shell_soup(target_faces=10000, shells=8, seed=0):
+    """Several overlapping spheres and tori, concatenated without welding."""
+    rng = np.random.default_rng(seed)
+    per_shell = max(20, target_faces // shells)
+    all_points, all_faces = [], []
+    offset = 0
+    for k in range(shells):
+        points, faces = icosphere(per_shell) if k % 2 == 0 else torus(per_shell)
+        points = points * rng.uniform(0.5, 1.5) + rng.uniform(-1.5, 1.5, size=3)
+        all_points.append(points)
+        all_faces.append(faces + offset)
+        offset += len(points)
+    return np.vstack(all_points), np.vstack(all_faces)
+
+
+GENERATORS = {
+    "icosphere": icosphere,
+    "torus": torus,
+    "noisy_scan": noisy_scan,
+    "shell_soup": shell_soup,
+}
@@ -0,0 +1,166 @@
+"""
+Undo/redo history for in-place mesh edits.
+
+Each history entry holds compact deltas instead of mesh copies: only the
+changed vertex ranges or flipped edges together with their previous values.
+Undo and redo swap the stored values with the current ones, so one copy
+serves both directions and each step costs O(size of the delta).
+"""
+from collections import deque
+
+import numpy as np
+
+
+def _runs(indices):
+    """Split sorted indices into contiguous (starts, lengths) ranges."""
+    if len(indices) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    breaks = np.flatnonzero(np.diff(indices) != 1) + 1
+    starts = indices[np.concatenate([[0], breaks])]
+    lengths = np.diff(np.concatenate([[0], breaks, [len(indices)]]))
+    return starts.astype(np.int64), lengths.astype(np.int64)
+
+
+class CoordinateDelta:
+    """Changed vertex coordinates, stored as index ranges plus the values to swap in."""
+
+    def __init__(self, starts, lengths, values):
+        self.starts = starts
+        self.lengths = lengths
+        self.values = values  # (sum(lengths) x 3)
+
+    @classmethod
+    def from_previous(cls, indices, old_coords):
+        """
+        Record an edit given the touched vertex indices and their coordinates from
+        before it, so undo restores them bit for bit.
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        order = np.argsort(indices)
+        starts, lengths = _runs(indices[order])
+        return cls(starts, lengths, np.asarray(old_coords, dtype=float).reshape(-1, 3)[order])
+
+    def indices(self):
+        offsets = np.cumsum(self.lengths) - self.lengths
+        return np.arange(int(self.lengths.sum())) + np.repeat(self.starts - offsets, self.lengths)
+
+    @property
+    def nbytes(self):
+        return self.starts.nbytes + self.lengths.nbytes + self.values.nbytes
+
+    def undo(self, vertices, edges, triangles):
+        for k, i in enumerate(self.indices()):
+            current = vertices[i].coords
+            vertices[i].coords = self.values[k].copy()
+            self.values[k] = current
+
+    redo = undo
+
+
+class EdgeFlipDelta:
+    """
+    A sequence of edge flips, built from the flip_log of try_edge_flip/beautify_mesh.
+    Flips are undone newest-first and redone oldest-first.
+    """
+
+    def __init__(self, flip_log):
+        self.edges = [record[0] for record in flip_log]  # Edge objects, one reference each
+        self.edge_vertices = np.array([(r[1], r[2]) for r in flip_log], dtype=np.int64).reshape(-1, 2)
+        self.triangle_indices = np.array([(r[3], r[5]) for r in flip_log], dtype=np.int64).reshape(-1, 2)
+        self.triangle_vertices = np.array([(r[4], r[6]) for r in flip_log], dtype=np.int64).reshape(-1, 2, 3)
+
+    @property
+    def nbytes(self):
+        return (8 * len(self.edges) + self.edge_vertices.nbytes
+                + self.triangle_indices.nbytes + self.triangle_vertices.nbytes)
+
+    def undo(self, vertices, edges, triangles):
+        self._swap(vertices, triangles, range(len(self.edges) - 1, -1, -1))
+
+    def redo(self, vertices, edges, triangles):
+        self._swap(vertices, triangles, range(len(self.edges)))
+
+    def _swap(self, vertices, triangles, order):
+        for k in order:
+            edge = self.edges[k]
+            current_edge = (edge.v1, edge.v2)
+            edge.v1, edge.v2 = self.edge_vertices[k].tolist()
+            self.edge_vertices[k] = current_edge
+            for j in range(2):
+                tri = triangles[self.triangle_indices[k, j]]
+                current = list(tri.vertex_indices)
+                tri.vertex_indices = self.triangle_vertices[k, j].tolist()
+                self.triangle_vertices[k, j] = current
+                tri.recompute_normal(vertices)
+
+
+class HistoryEntry:
+    def __init__(self, label, deltas):
+        self.label = label
+        self.deltas = deltas
+        self.nbytes = sum(d.nbytes for d in deltas)
+
+
+class MeshHistory:
+    """
+    Bounded undo/redo stacks. When the stored deltas exceed max_bytes the
+    oldest undo entries are evicted first.
+    """
+
+    def __init__(self, max_bytes=256 * 2**20):
+        self.max_bytes = max_bytes
+        self.undo_stack = deque()
+        self.redo_stack = []
+        self.nbytes = 0
+
+    def push(self, label, deltas):
+        """
+        Record an applied edit. Clears the redo stack.
+        Returns False if the edit alone is larger than max_bytes. It cannot be
+        undone then, and the older entries no longer describe the mesh, so the
+        whole history is cleared.
+        """
+        for entry in self.redo_stack:
+            self.nbytes -= entry.nbytes
+        self.redo_stack.clear()
+
+        entry = HistoryEntry(label, list(deltas))
+        if entry.nbytes > self.max_bytes:
+            self.clear()
+            return False
+        self.undo_stack.append(entry)
+        self.nbytes += entry.nbytes
+        while self.nbytes > self.max_bytes:
+            self.nbytes -= self.undo_stack.popleft().nbytes
+        return True
+
+    def can_undo(self):
+        return bool(self.undo_stack)
+
+    def can_redo(self):
+        return bool(self.redo_stack)
+
+    def undo(self, vertices, edges, triangles):
+        """Revert the newest edit. Returns its label, or None if there is nothing to undo."""
+        if not self.undo_stack:
+            return None
+        entry = self.undo_stack.pop()
+        for delta in reversed(entry.deltas):
+            delta.undo(vertices, edges, triangles)
+        self.redo_stack.append(entry)
+        return entry.label
+
+    def redo(self, vertices, edges, triangles):
+        """Re-apply the most recently undone edit. Returns its label, or None."""
+        if not self.redo_stack:
+            return None
+        entry = self.redo_stack.pop()
+        for delta in entry.deltas:
+            delta.redo(vertices, edges, triangles)
+        self.undo_stack.append(entry)
+        return entry.label
+
+    def clear(self):
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+        self.nbytes = 0
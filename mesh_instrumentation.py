@@ -0,0 +1,357 @@
+"""
+Structured progress, timing and memory instrumentation for the mesh pipeline.
+
+Pipeline functions open nested stages and report items done; sinks decide
+what to do with the resulting events (update the GUI status line, log, or
+write a JSON trace viewable in chrome://tracing / Perfetto).
+
+    instr = Instrumentation([LogSink(), JsonTraceSink("trace.json")])
+    with instr.stage("Building edges", total=len(faces)) as stage:
+        for face in faces:
+            ...
+            stage.advance()
+
+Legacy progress_callback arguments keep working: as_instrumentation() wraps a
+plain callable in a CallbackSink that receives formatted status strings.
+"""
+import cProfile
+import json
+import logging
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+def peak_rss_bytes():
+    """Peak resident set size of this process, or None where unsupported."""
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def current_rss_bytes():
+    """Current resident set size of this process (from /proc), or None where unsupported."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class StageEvent:
+    """One structured event: kind is 'start', 'progress', 'end' or 'message'."""
+
+    def __init__(self, kind, name, path, done=0, total=None, elapsed=0.0, bytes=0,
+                 peak_bytes=None, message=None, start_time=None, process_peak_rss=None):
+        self.kind = kind
+        self.name = name
+        self.path = path  # "parent/child" stage path
+        self.done = done
+        self.total = total
+        self.elapsed = elapsed
+        self.bytes = bytes
+        self.peak_bytes = peak_bytes  # this stage's tracemalloc peak, if traced
+        self.process_peak_rss = process_peak_rss  # process-lifetime peak, not per stage
+        self.message = message
+        self.start_time = start_time
+        self.thread_id = threading.get_ident()
+
+    @property
+    def percent(self):
+        if not self.total:
+            return None
+        return min(100, int(self.done * 100 / self.total))
+
+    def to_dict(self):
+        return {
+            "kind": self.kind,
+            "name": self.name,
+            "path": self.path,
+            "done": self.done,
+            "total": self.total,
+            "elapsed": self.elapsed,
+            "bytes": self.bytes,
+            "peak_bytes": self.peak_bytes,
+            "process_peak_rss": self.process_peak_rss,
+            "message": self.message,
+        }
+
+
+class Stage:
+    """A timed span. Use as a context manager via Instrumentation.stage()."""
+
+    def __init__(self, instrumentation, name, total=None, parent=None):
+        self.instrumentation = instrumentation
+        self.name = name
+        self.total = total
+        self.parent = parent
+        self.path = f"{parent.path}/{name}" if parent else name
+        self.done = 0
+        self.bytes = 0
+        self.peak_bytes = None
+        self.process_peak_rss = None
+        self.start_time = None
+        self.elapsed = 0.0
+        self._child_peak = 0
+        self._next_emit = 0
+        self._step = max(1, total // 100) if total else 1
+        self._profiler = None
+
+    def __enter__(self):
+        instr = self.instrumentation
+        instr._push(self)
+        if instr.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            if self.parent is not None:
+                # Keep the parent's peak so far before resetting for this child.
+                self.parent._child_peak = max(self.parent._child_peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        if instr.should_profile(self.name) and not instr._profiling:
+            self._profiler = cProfile.Profile()
+            instr._profiling = True
+            self._profiler.enable()
+        self.start_time = time.perf_counter()
+        self._next_emit = self._step
+        instr.emit(StageEvent("start", self.name, self.path, total=self.total, start_time=self.start_time))
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        instr = self.instrumentation
+        self.elapsed = time.perf_counter() - self.start_time
+        if self._profiler is not None:
+            self._profiler.disable()
+            instr._profiling = False
+            instr._store_profile(self)
+        if instr.trace_memory and tracemalloc.is_tracing():
+            self.peak_bytes = max(tracemalloc.get_traced_memory()[1], self._child_peak)
+            if self.parent is not None:
+                self.parent._child_peak = max(self.parent._child_peak, self.peak_bytes)
+        # ru_maxrss never goes down, so it says nothing about this stage alone.
+        self.process_peak_rss = peak_rss_bytes()
+        instr._pop(self)
+        instr.emit(StageEvent(
+            "end", self.name, self.path, done=self.done, total=self.total, elapsed=self.elapsed,
+            bytes=self.bytes, peak_bytes=self.peak_bytes, start_time=self.start_time,
+            process_peak_rss=self.process_peak_rss,
+        ))
+        return False
+
+    def advance(self, n=1):
+        """Mark n more items as done. Cheap; emits at most ~100 progress events per stage."""
+        self.done += n
+        if self.done >= self._next_emit:
+            self._next_emit = self.done + self._step
+            if self.instrumentation.sinks:
+                self.instrumentation.emit(StageEvent(
+                    "progress", self.name, self.path, done=self.done, total=self.total,
+                    elapsed=time.perf_counter() - self.start_time, bytes=self.bytes,
+                ))
+
+    def add_bytes(self, n):
+        self.bytes += n
+
+
+class Instrumentation:
+    """
+    Dispatches stage events to sinks.
+    profile: False, True (all stages) or a collection of stage names to run under cProfile.
+    trace_memory: record tracemalloc peaks per stage (slower; otherwise only the
+    process peak RSS so far is reported).
+    profile_dir: if set, each profile is also dumped there as <stage>.prof.
+    """
+
+    def __init__(self, sinks=None, profile=False, trace_memory=False, profile_dir=None):
+        self.sinks = list(sinks or [])
+        self.profile = profile
+        self.trace_memory = trace_memory
+        self.profile_dir = profile_dir
+        self.profiles = {}  # stage path -> pstats.Stats
+        self._local = threading.local()
+        self._profiling = False
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+
+    def background(self):
+        """
+        Instrumentation for work running next to this one in another thread.
+        It shares the same sink objects (so one JSON trace collects both) and
+        settings, but leaves out CallbackSinks so the status line is not overwritten.
+        """
+        other = Instrumentation(
+            [sink for sink in self.sinks if not isinstance(sink, CallbackSink)],
+            profile=self.profile, trace_memory=self.trace_memory, profile_dir=self.profile_dir,
+        )
+        other.profiles = self.profiles
+        return other
+
+    def should_profile(self, name):
+        if self.profile is True:
+            return True
+        return bool(self.profile) and name in self.profile
+
+    def _stack(self):
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def _push(self, stage):
+        self._stack().append(stage)
+
+    def _pop(self, stage):
+        stack = self._stack()
+        if stack and stack[-1] is stage:
+            stack.pop()
+
+    def _store_profile(self, stage):
+        stats = pstats.Stats(stage._profiler)
+        self.profiles[stage.path] = stats
+        if self.profile_dir:
+            os.makedirs(self.profile_dir, exist_ok=True)
+            safe_name = stage.path.replace("/", "__").replace(" ", "_")
+            stats.dump_stats(os.path.join(self.profile_dir, f"{safe_name}.prof"))
+
+    def stage(self, name, total=None):
+        stack = self._stack()
+        return Stage(self, name, total=total, parent=stack[-1] if stack else None)
+
+    def message(self, text):
+        stack = self._stack()
+        path = stack[-1].path if stack else ""
+        self.emit(StageEvent("message", path.rsplit("/", 1)[-1], path, message=text))
+
+    def emit(self, event):
+        for sink in self.sinks:
+            sink.handle(event)
+
+    def close(self):
+        for sink in self.sinks:
+            if hasattr(sink, "close"):
+                sink.close()
+
+
+class CallbackSink:
+    """Turns events into short status strings for a legacy progress_callback (e.g. the GUI)."""
+
+    def __init__(self, callback):
+        self.callback = callback
+
+    def handle(self, event):
+        if event.kind == "start":
+            self.callback(f"{event.name}...")
+        elif event.kind == "progress" and event.percent is not None:
+            self.callback(f"{event.name}... {event.percent}%")
+        elif event.kind == "end" and "/" not in event.path:
+            self.callback(f"{event.name} complete ({event.elapsed:.2f}s)")
+        elif event.kind == "message":
+            self.callback(event.message)
+
+
+class LogSink:
+    """Logs stage completion (INFO) and progress (DEBUG) through the logging module."""
+
+    def __init__(self, logger=None):
+        self.logger = logger or logging.getLogger("mesh")
+
+    def handle(self, event):
+        if event.kind == "end":
+            if event.peak_bytes:
+                peak = f", peak {event.peak_bytes / 2**20:.1f} MiB"
+            elif event.process_peak_rss:
+                peak = f", process peak RSS {event.process_peak_rss / 2**20:.1f} MiB"
+            else:
+                peak = ""
+            items = f", {event.done} items" if event.done else ""
+            self.logger.info("%s took %.3fs%s%s", event.path, event.elapsed, items, peak)
+        elif event.kind == "progress":
+            self.logger.debug("%s: %s/%s", event.path, event.done, event.total)
+        elif event.kind == "message":
+            self.logger.info("%s: %s", event.path, event.message)
+
+
+class JsonTraceSink:
+    """
+    Collects finished stages as Chrome trace events and rewrites the JSON
+    file whenever a top-level stage ends, so the trace survives crashes.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.events = []
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def handle(self, event):
+        if event.kind != "end":
+            return
+        with self._lock:
+            self.events.append({
+                "name": event.name,
+                "cat": event.path,
+                "ph": "X",
+                "ts": (event.start_time - self._origin) * 1e6,
+                "dur": event.elapsed * 1e6,
+                "pid": os.getpid(),
+                "tid": event.thread_id,
+                "args": {
+                    "done": event.done,
+                    "total": event.total,
+                    "bytes": event.bytes,
+                    "peak_bytes": event.peak_bytes,
+                    "process_peak_rss": event.process_peak_rss,
+                },
+            })
+            if "/" not in event.path:
+                self._write()
+
+    def _write(self):
+        with open(self.path, "w") as f:
+            json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, f)
+
+    def close(self):
+        with self._lock:
+            self._write()
+
+
+_NULL = Instrumentation()
+
+
+def as_instrumentation(progress_callback=None):
+    """
+    Accept an Instrumentation, a legacy progress_callback(str) or None.
+    None maps to a shared sink-less instance, which costs almost nothing.
+    """
+    if isinstance(progress_callback, Instrumentation):
+        return progress_callback
+    if progress_callback is None:
+        return _NULL
+    return Instrumentation([CallbackSink(progress_callback)])
+
+
+def instrumentation_from_env(progress_callback=None):
+    """
+    Build the production instrumentation: the given callback, the 'mesh' logger,
+    plus a JSON trace (MESH_TRACE_FILE) and per-stage profiles (MESH_PROFILE_DIR)
+    when those environment variables are set.
+    """
+    sinks = [LogSink()]
+    if progress_callback is not None:
+        sinks.insert(0, CallbackSink(progress_callback))
+    trace_file = os.environ.get("MESH_TRACE_FILE")
+    if trace_file:
+        sinks.append(JsonTraceSink(trace_file))
+    profile_dir = os.environ.get("MESH_PROFILE_DIR")
+    return Instrumentation(
+        sinks,
+        profile=bool(profile_dir),
+        trace_memory=os.environ.get("MESH_TRACE_MEMORY") == "1",
+        profile_dir=profile_dir,
+    )
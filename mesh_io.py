@@ -1,3 +1,4 @@
+import pyvista as pv
 from mesh_data_structure import build_mesh_from_stl
 
 def load_stl(file_path):
@@ -5,6 +6,11 @@ def load_stl(file_path):
     vertices, edges, triangles = build_mesh_from_stl(file_path)
     return vertices, edges, triangles
 
+def load_stl_arrays(file_path):
+    """Read an STL file straight into (points Nx3, faces Mx3) numpy arrays."""
+    mesh = pv.read(file_path).triangulate()
+    return mesh.points, mesh.faces.reshape((-1, 4))[:, 1:4]
+
 def repair_mesh(mesh_data):
     # Placeholder for future repair logic on custom data structure
     return mesh_data
@@ -1,12 +1,14 @@
 import numpy as np
 import pyvista as pv
 from math import acos, degrees
+from mesh_instrumentation import as_instrumentation
 
-def laplacian_smoothing(vertices, edges, triangles, iterations=1, lambda_factor=0.5):
+def laplacian_smoothing(vertices, edges, triangles, iterations=1, lambda_factor=0.5, progress_callback=None):
     """
     Apply Laplacian smoothing on vertices.
     Returns new vertices positions and difference vectors.
     """
+    instr = as_instrumentation(progress_callback)
     V = len(vertices)
     coords = np.array([v.coords for v in vertices])
     original_coords = coords.copy()
@@ -17,17 +19,19 @@ def laplacian_smoothing(vertices, edges, triangles, iterations=1, lambda_factor=
         adjacency[e.v1].append(e.v2)
         adjacency[e.v2].append(e.v1)
 
-    for it in range(iterations):
-        new_coords = coords.copy()
-        for i in range(V):
-            neighbors = adjacency[i]
-            if not neighbors:
-                continue
-            neighbor_coords = coords[neighbors]
-            avg = neighbor_coords.mean(axis=0)
-            # Move vertex toward average by lambda_factor
-            new_coords[i] = coords[i] + lambda_factor * (avg - coords[i])
-        coords = new_coords
+    with instr.stage("Laplacian smoothing", total=iterations * V) as stage:
+        for it in range(iterations):
+            new_coords = coords.copy()
+            for i in range(V):
+                neighbors = adjacency[i]
+                if not neighbors:
+                    continue
+                neighbor_coords = coords[neighbors]
+                avg = neighbor_coords.mean(axis=0)
+                # Move vertex toward average by lambda_factor
+                new_coords[i] = coords[i] + lambda_factor * (avg - coords[i])
+            coords = new_coords
+            stage.advance(V)
 
     # Compute difference vectors
     diff_vectors = coords - original_coords
@@ -98,8 +102,12 @@ def triangle_aspect_ratio(p1, p2, p3):
     return 4 * np.sqrt(3) * area / (a**2 + b**2 + c**2)
 
 
-def try_edge_flip(edge, vertices, edges, triangles):
-    """Try flipping an edge if it improves triangle quality. Returns True if flipped."""
+def try_edge_flip(edge, vertices, edges, triangles, flip_log=None):
+    """
+    Try flipping an edge if it improves triangle quality. Returns True if flipped.
+    If flip_log is a list, the flip is appended to it as
+    (edge, old_v1, old_v2, t1_idx, t1_old_indices, t2_idx, t2_old_indices).
+    """
     if len(edge.triangles) != 2:
         return False  # cannot flip boundary edge
 
@@ -133,6 +141,9 @@ def try_edge_flip(edge, vertices, edges, triangles):
     if new_quality <= old_quality:
         return False  # no improvement
 
+    if flip_log is not None:
+        flip_log.append((edge, edge.v1, edge.v2, t1_idx, list(t1.vertex_indices), t2_idx, list(t2.vertex_indices)))
+
     # ✅ Perform the flip: edge becomes (a, b)
     edge.v1, edge.v2 = a, b
 
@@ -146,10 +157,13 @@ def try_edge_flip(edge, vertices, edges, triangles):
     return True
 
 
-def beautify_mesh(vertices, edges, triangles):
-    """Try flipping all edges to improve triangle quality."""
+def beautify_mesh(vertices, edges, triangles, progress_callback=None, flip_log=None):
+    """Try flipping all edges to improve triangle quality. flip_log: see try_edge_flip."""
+    instr = as_instrumentation(progress_callback)
     flip_count = 0
-    for edge in edges:
-        if try_edge_flip(edge, vertices, edges, triangles):
-            flip_count += 1
+    with instr.stage("Beautifying mesh", total=len(edges)) as stage:
+        for edge in edges:
+            if try_edge_flip(edge, vertices, edges, triangles, flip_log):
+                flip_count += 1
+            stage.advance()
     return flip_count
\ No newline at end of file
@@ -0,0 +1,545 @@
+"""
+Out-of-core mesh building for STL files larger than RAM.
+
+The STL is streamed in chunks. Vertices are welded by hashing their
+coordinates into partition files on disk and de-duplicating one partition
+at a time; edges are built the same way with a partitioned sort-merge.
+All results live in memory-mapped arrays inside a work directory, so peak
+memory is set by memory_budget rather than by the size of the mesh.
+"""
+import json
+import os
+import shutil
+import tempfile
+from collections import defaultdict, deque
+
+import numpy as np
+
+from mesh_data_structure import unit_face_normals
+from mesh_instrumentation import as_instrumentation
+
+STL_RECORD = np.dtype([("normal", "<f4", (3,)), ("vectors", "<f4", (3, 3)), ("attr", "<u2")])
+CORNER_RECORD = np.dtype([("xyz", "<f4", (3,)), ("corner", "<i8")])
+DEFAULT_MEMORY_BUDGET = 512 * 2**20
+
+# Peak bytes of working memory per item while a chunk or partition is processed.
+_STREAM_BYTES_PER_TRIANGLE = 400
+_WELD_BYTES_PER_CORNER = 160
+_PLACE_BYTES_PER_ITEM = 96
+_EDGE_BYTES_PER_HALF_EDGE = 160
+_CHECK_BYTES_PER_EDGE = 64
+_HOLE_BYTES_PER_EDGE = 400  # np.unique plus the Python adjacency lists
+
+# Partition files written at the same time; well below the usual 1024 open-file limit.
+MAX_OPEN_PARTITIONS = 256
+
+
+class OutOfCoreMesh:
+    """
+    Memory-mapped mesh arrays stored in work_dir:
+    points (V x 3 float32), faces (F x 3), valence (V),
+    edges (E x 2), edge_faces (E x 2, -1 where missing),
+    edge_face_count (E), face_edges (F x 3, edge opposite each corner).
+    """
+
+    def __init__(self, work_dir, owns_work_dir=False):
+        self.work_dir = work_dir
+        self.owns_work_dir = owns_work_dir
+        self.points = None
+        self.faces = None
+        self.valence = None
+        self.edges = None
+        self.edge_faces = None
+        self.edge_face_count = None
+        self.face_edges = None
+
+    def path(self, name):
+        return os.path.join(self.work_dir, name)
+
+    def close(self):
+        """Drop the memory maps and remove the work directory if we created it."""
+        for name in ("points", "faces", "valence", "edges", "edge_faces", "edge_face_count", "face_edges"):
+            setattr(self, name, None)
+        if self.owns_work_dir:
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+
+
+def _is_binary_stl(file_path):
+    size = os.path.getsize(file_path)
+    with open(file_path, "rb") as f:
+        header = f.read(84)
+    if len(header) < 84:
+        return False
+    count = int(np.frombuffer(header[80:84], dtype="<u4")[0])
+    return size == 84 + count * STL_RECORD.itemsize
+
+
+def _stl_triangle_count_estimate(file_path):
+    if _is_binary_stl(file_path):
+        with open(file_path, "rb") as f:
+            f.seek(80)
+            return int(np.frombuffer(f.read(4), dtype="<u4")[0])
+    return max(1, os.path.getsize(file_path) // 250)  # ~250 bytes per ASCII facet
+
+
+def iter_stl_triangles(file_path, chunk_triangles=1_000_000):
+    """Yield (k x 3 x 3) float32 arrays of triangle corners, chunk by chunk."""
+    if _is_binary_stl(file_path):
+        with open(file_path, "rb") as f:
+            f.seek(84)
+            while True:
+                records = np.fromfile(f, dtype=STL_RECORD, count=chunk_triangles)
+                if len(records) == 0:
+                    break
+                yield records["vectors"]
+        return
+
+    # Parse straight into float32 chunks; a list of tuples would take ~10x the memory.
+    coords = np.empty((chunk_triangles * 3, 3), dtype=np.float32)
+    count = 0
+    with open(file_path, "r", errors="replace") as f:
+        for line in f:
+            parts = line.split()
+            if parts and parts[0] == "vertex":
+                coords[count] = float(parts[1]), float(parts[2]), float(parts[3])
+                count += 1
+                if count == len(coords):
+                    yield coords.reshape(-1, 3, 3)
+                    coords = np.empty_like(coords)
+                    count = 0
+    if count:
+        yield coords[:count].reshape(-1, 3, 3)
+
+
+def _coordinate_hash(xyz, partitions):
+    """Partition id from the exact float32 bit patterns of each point."""
+    bits = (xyz + np.float32(0.0)).view(np.uint32).astype(np.uint64)  # + 0.0 folds -0.0 into 0.0
+    h = bits[:, 0] * np.uint64(73856093) ^ bits[:, 1] * np.uint64(19349663) ^ bits[:, 2] * np.uint64(83492791)
+    return (h % np.uint64(partitions)).astype(np.int64)
+
+
+def _partition_groups(partitions):
+    """
+    Split partition ids into groups of at most MAX_OPEN_PARTITIONS. The input
+    is streamed once per group, so only one group's files are open at a time.
+    """
+    return [range(first, min(first + MAX_OPEN_PARTITIONS, partitions))
+            for first in range(0, partitions, MAX_OPEN_PARTITIONS)]
+
+
+def _append_partitions(handles, records, partition_ids, first=0):
+    """Append records to handles[p - first] for partition ids p in [first, first + len(handles))."""
+    order = np.argsort(partition_ids, kind="stable")
+    records = records[order]
+    partition_ids = partition_ids[order]
+    bounds = np.searchsorted(partition_ids, np.arange(first, first + len(handles) + 1))
+    for p in range(len(handles)):
+        if bounds[p + 1] > bounds[p]:
+            records[bounds[p]:bounds[p + 1]].tofile(handles[p])
+
+
+def _spill_by_index(paths, range_size, index, values):
+    """
+    Append (index, value) records to the range files paths[index // range_size],
+    one file open at a time. _write_in_index_order() later assembles them.
+    """
+    order = np.argsort(index)
+    records = np.empty(len(order), dtype=[("index", "<i8"), ("value", values.dtype)])
+    records["index"] = index[order]
+    records["value"] = values[order]
+    bounds = np.searchsorted(records["index"], np.arange(len(paths) + 1) * range_size)
+    for r in np.flatnonzero(np.diff(bounds)):
+        with open(paths[r], "ab") as f:
+            records[bounds[r]:bounds[r + 1]].tofile(f)
+
+
+def _write_in_index_order(paths, range_size, dtype, out_file, stage):
+    """
+    Write the values spilled by _spill_by_index to out_file in index order, one
+    range at a time, so the output is written sequentially instead of scattered.
+    """
+    record = np.dtype([("index", "<i8"), ("value", dtype)])
+    for r, path in enumerate(paths):
+        records = np.fromfile(path, dtype=record)
+        os.remove(path)
+        block = np.empty(len(records), dtype=dtype)
+        block[records["index"] - r * range_size] = records["value"]
+        block.tofile(out_file)
+        stage.advance()
+
+
+def _range_files(mesh, name, total, range_size):
+    """Empty files for consecutive index ranges of range_size items."""
+    paths = [mesh.path(f"{name}_{r}.bin") for r in range(-(-total // range_size))]
+    for path in paths:
+        open(path, "wb").close()
+    return paths
+
+
+def _open_memmap(path, dtype, shape, mode="r+"):
+    if shape[0] == 0:
+        return np.zeros(shape, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode=mode, shape=shape)
+
+
+def _read_rows(array, start, stop):
+    """
+    Rows start:stop of an OutOfCoreMesh array. Memory maps are read through their
+    file, so the pages do not stay mapped (and resident) after the chunk is used.
+    """
+    if not isinstance(array, np.memmap):
+        return np.asarray(array[start:stop])
+    stop = min(stop, len(array))
+    row = int(np.prod(array.shape[1:], dtype=np.int64))
+    return np.fromfile(array.filename, dtype=array.dtype, count=max(stop - start, 0) * row,
+                       offset=array.offset + start * row * array.itemsize).reshape((-1,) + array.shape[1:])
+
+
+# Each partition is processed in its own function so its arrays are freed
+# before the next phase allocates.
+def _stream_group(file_path, chunk_triangles, part_paths, partitions, group, stage):
+    """Stream the STL once, appending corner records to the partitions of group. Returns the corner count."""
+    handles = [open(part_paths[p], "wb") for p in group]
+    corner_count = 0
+    try:
+        for triangles in iter_stl_triangles(file_path, chunk_triangles):
+            xyz = triangles.reshape(-1, 3)
+            records = np.empty(len(xyz), dtype=CORNER_RECORD)
+            records["xyz"] = xyz
+            records["corner"] = np.arange(corner_count, corner_count + len(xyz))
+            _append_partitions(handles, records, _coordinate_hash(xyz, partitions), group.start)
+            corner_count += len(xyz)
+            stage.add_bytes(triangles.nbytes)
+            stage.advance(len(triangles))
+    finally:
+        for handle in handles:
+            handle.close()
+    return corner_count
+
+
+def _weld_partition(path, vertex_count, index_dtype, face_ranges, range_size, points_file, valence_file):
+    """Weld one corner partition; the corner count of a vertex is its valence. Returns the vertices it adds."""
+    records = np.fromfile(path, dtype=CORNER_RECORD)
+    os.remove(path)
+    if len(records) == 0:
+        return 0
+    xyz = np.ascontiguousarray(records["xyz"]) + np.float32(0.0)
+    keys = xyz.view(np.dtype((np.void, xyz.dtype.itemsize * 3))).ravel()
+    _, first, inverse, counts = np.unique(keys, return_index=True, return_inverse=True, return_counts=True)
+    xyz[first].tofile(points_file)
+    counts.astype(np.int32).tofile(valence_file)
+    vertex_ids = (vertex_count + inverse.reshape(-1)).astype(index_dtype)
+    _spill_by_index(face_ranges, range_size, records["corner"], vertex_ids)
+    return len(first)
+
+
+def build_out_of_core_mesh(file_path, work_dir=None, memory_budget=DEFAULT_MEMORY_BUDGET, progress_callback=None):
+    """
+    Build an OutOfCoreMesh from an STL file using at most roughly memory_budget bytes.
+    progress_callback: legacy callable(str) or a mesh_instrumentation.Instrumentation.
+    """
+    instr = as_instrumentation(progress_callback)
+    owns_work_dir = work_dir is None
+    if owns_work_dir:
+        work_dir = tempfile.mkdtemp(prefix="mesh_ooc_")
+    os.makedirs(work_dir, exist_ok=True)
+    mesh = OutOfCoreMesh(work_dir, owns_work_dir)
+
+    estimated_faces = _stl_triangle_count_estimate(file_path)
+    chunk_triangles = max(1024, memory_budget // _STREAM_BYTES_PER_TRIANGLE)
+    partitions = max(1, -(-3 * estimated_faces * _WELD_BYTES_PER_CORNER // memory_budget))
+    range_size = max(1024, memory_budget // _PLACE_BYTES_PER_ITEM)
+
+    with instr.stage("Building out-of-core mesh"):
+        # --- 1. Stream corners into hashed partitions ---
+        part_paths = [mesh.path(f"weld_{p}.bin") for p in range(partitions)]
+        groups = _partition_groups(partitions)
+        with instr.stage("Streaming STL", total=estimated_faces * len(groups)) as stage:
+            for group in groups:
+                corner_count = _stream_group(file_path, chunk_triangles, part_paths, partitions, group, stage)
+
+        face_count = corner_count // 3
+        index_dtype = np.int32 if corner_count < 2**31 else np.int64
+
+        # --- 2. Weld each partition; the corner count of a vertex is its valence ---
+        face_ranges = _range_files(mesh, "faces", corner_count, range_size)
+        vertex_count = 0
+        with open(mesh.path("points.bin"), "wb") as points_file, open(mesh.path("valence.bin"), "wb") as valence_file:
+            with instr.stage("Welding vertices", total=partitions) as stage:
+                for path in part_paths:
+                    vertex_count += _weld_partition(path, vertex_count, index_dtype, face_ranges, range_size,
+                                                    points_file, valence_file)
+                    stage.advance()
+
+        # --- 3. Write the faces in corner order, one range at a time ---
+        with open(mesh.path("faces.bin"), "wb") as faces_file:
+            with instr.stage("Writing faces", total=len(face_ranges)) as stage:
+                _write_in_index_order(face_ranges, range_size, index_dtype, faces_file, stage)
+        mesh.faces = _open_memmap(mesh.path("faces.bin"), index_dtype, (face_count, 3))
+        mesh.points = _open_memmap(mesh.path("points.bin"), np.float32, (vertex_count, 3))
+        mesh.valence = _open_memmap(mesh.path("valence.bin"), np.int32, (vertex_count,))
+
+        # --- 4. Edge table by partitioned sort-merge ---
+        _build_edge_tables(mesh, face_count, index_dtype, memory_budget, range_size, instr)
+
+    return mesh
+
+
+def _partition_half_edges(faces_array, face_chunk, half_record, part_paths, partitions, group, stage):
+    """Read the faces in chunks, appending half-edge records to the partitions of group."""
+    handles = [open(part_paths[p], "wb") for p in group]
+    try:
+        for start in range(0, len(faces_array), face_chunk):
+            faces = _read_rows(faces_array, start, start + face_chunk)
+            # Half-edge k of a face is the edge opposite corner k, like Triangle.edge_indices.
+            a = faces[:, [1, 2, 0]].ravel()
+            b = faces[:, [2, 0, 1]].ravel()
+            records = np.empty(len(a), dtype=half_record)
+            records["lo"] = np.minimum(a, b)
+            records["hi"] = np.maximum(a, b)
+            records["half"] = np.arange(start * 3, start * 3 + len(a))
+            _append_partitions(handles, records, records["lo"].astype(np.int64) % partitions, group.start)
+            stage.advance(len(faces))
+    finally:
+        for handle in handles:
+            handle.close()
+
+
+def _merge_partition(path, half_record, edge_count, half_ranges, range_size, edges_file, edge_faces_file,
+                     counts_file):
+    """Merge the half-edges of one partition into edges. Returns the number of edges found."""
+    records = np.fromfile(path, dtype=half_record)
+    os.remove(path)
+    if len(records) == 0:
+        return 0
+    records = records[np.lexsort((records["half"], records["hi"], records["lo"]))]
+    new_run = np.ones(len(records), dtype=bool)
+    new_run[1:] = (records["lo"][1:] != records["lo"][:-1]) | (records["hi"][1:] != records["hi"][:-1])
+    starts = np.flatnonzero(new_run)
+    counts = np.diff(np.append(starts, len(records)))
+
+    _spill_by_index(half_ranges, range_size, records["half"], edge_count + np.cumsum(new_run) - 1)
+
+    faces_of_edge = np.full((len(starts), 2), -1, dtype=np.int64)
+    faces_of_edge[:, 0] = records["half"][starts] // 3
+    has_second = counts >= 2
+    faces_of_edge[has_second, 1] = records["half"][starts[has_second] + 1] // 3
+
+    np.stack([records["lo"][starts], records["hi"][starts]], axis=1).astype(np.int64).tofile(edges_file)
+    faces_of_edge.tofile(edge_faces_file)
+    counts.astype(np.int32).tofile(counts_file)
+    return len(starts)
+
+
+def _build_edge_tables(mesh, face_count, index_dtype, memory_budget, range_size, instr):
+    half_record = np.dtype([("lo", index_dtype), ("hi", index_dtype), ("half", "<i8")])
+    face_chunk = max(1024, memory_budget // (3 * _EDGE_BYTES_PER_HALF_EDGE))
+    partitions = max(1, -(-3 * face_count * _EDGE_BYTES_PER_HALF_EDGE // memory_budget))
+    part_paths = [mesh.path(f"edges_{p}.bin") for p in range(partitions)]
+
+    groups = _partition_groups(partitions)
+    with instr.stage("Partitioning half-edges", total=face_count * len(groups)) as stage:
+        for group in groups:
+            _partition_half_edges(mesh.faces, face_chunk, half_record, part_paths, partitions, group, stage)
+
+    half_ranges = _range_files(mesh, "face_edges", 3 * face_count, range_size)
+    edge_count = 0
+    with open(mesh.path("edges.bin"), "wb") as edges_file, \
+            open(mesh.path("edge_faces.bin"), "wb") as edge_faces_file, \
+            open(mesh.path("edge_face_count.bin"), "wb") as counts_file:
+        with instr.stage("Merging edges", total=partitions) as stage:
+            for path in part_paths:
+                edge_count += _merge_partition(path, half_record, edge_count, half_ranges, range_size,
+                                               edges_file, edge_faces_file, counts_file)
+                stage.advance()
+
+    with open(mesh.path("face_edges.bin"), "wb") as face_edges_file:
+        with instr.stage("Writing face edges", total=len(half_ranges)) as stage:
+            _write_in_index_order(half_ranges, range_size, np.int64, face_edges_file, stage)
+    mesh.face_edges = _open_memmap(mesh.path("face_edges.bin"), np.int64, (face_count, 3))
+    mesh.edges = _open_memmap(mesh.path("edges.bin"), np.int64, (edge_count, 2), mode="r")
+    mesh.edge_faces = _open_memmap(mesh.path("edge_faces.bin"), np.int64, (edge_count, 2), mode="r")
+    mesh.edge_face_count = _open_memmap(mesh.path("edge_face_count.bin"), np.int32, (edge_count,), mode="r")
+
+
+def _limited(messages, found, limit, summary):
+    """Keep at most limit individual messages and summarise the rest."""
+    if found > limit:
+        messages.append(summary.format(found - limit))
+
+
+def sanity_check_out_of_core(mesh, memory_budget=DEFAULT_MEMORY_BUDGET, max_messages=100, progress_callback=None):
+    """
+    The checks of mesh_sanity_check.sanity_check_mesh, run chunk by chunk over
+    the memory maps. Per-item messages are capped at max_messages per check.
+    Boundary edges are spilled to the work directory; holes are only traced
+    one by one when they fit in memory_budget.
+    Returns the same results dict, usable with generate_sanity_report.
+    """
+    instr = as_instrumentation(progress_callback)
+    chunk_size = max(1024, memory_budget // _CHECK_BYTES_PER_EDGE)
+    results = {
+        "valid": True,
+        "errors": [],
+        "warnings": [],
+        "holes": [],
+        "euler_check": None,
+    }
+    V, E, F = len(mesh.points), len(mesh.edges), len(mesh.faces)
+
+    with instr.stage("Out-of-core sanity check"):
+        # --- 1. Check edges, collect boundary edges ---
+        boundary_path = mesh.path("boundary_edges.bin")
+        boundary_count = 0
+        with instr.stage("Checking edges", total=E) as stage, open(boundary_path, "wb") as boundary_file:
+            found = 0
+            for start in range(0, E, chunk_size):
+                counts = _read_rows(mesh.edge_face_count, start, start + chunk_size)
+                for i in np.flatnonzero(counts > 2):
+                    if found < max_messages:
+                        results["errors"].append(f"Edge {start + i} belongs to more than 2 triangles ({counts[i]}).")
+                    found += 1
+                boundary = _read_rows(mesh.edges, start, start + chunk_size)[counts == 1]
+                boundary.tofile(boundary_file)
+                boundary_count += len(boundary)
+                stage.advance(len(counts))
+            if found:
+                results["valid"] = False
+            _limited(results["errors"], found, max_messages, "... and {} more non-manifold edges.")
+
+        # --- 2. Check valence ---
+        with instr.stage("Checking vertex valence", total=V) as stage:
+            found = 0
+            for start in range(0, V, chunk_size):
+                valence = _read_rows(mesh.valence, start, start + chunk_size)
+                for i in np.flatnonzero(valence < 3):
+                    if found < max_messages:
+                        results["warnings"].append(f"Vertex {start + i} has valence {valence[i]} < 3.")
+                    found += 1
+                stage.advance(len(valence))
+            _limited(results["warnings"], found, max_messages, "... and {} more vertices with valence < 3.")
+
+        # --- 3. Duplicate vertices ---
+        # Welding merged every exact coordinate match, so none can remain.
+
+        # --- 4. Euler's formula ---
+        euler_value = V - E + F
+        results["euler_check"] = euler_value
+        if euler_value != 2:
+            results["warnings"].append(f"Euler characteristic V - E + F = {euler_value} (expected 2 for closed manifold).")
+
+        # --- 5. Check holes (boundary edges only, which are few on real parts) ---
+        with instr.stage("Checking for holes", total=boundary_count) as stage:
+            if boundary_count * _HOLE_BYTES_PER_EDGE > memory_budget:
+                results["warnings"].append(
+                    f"Found {boundary_count} boundary edges; too many to trace individual holes within the memory budget."
+                )
+            elif boundary_count:
+                boundary_edges = np.fromfile(boundary_path, dtype=np.int64).reshape(-1, 2)
+                boundary_vertices, local = np.unique(boundary_edges, return_inverse=True)
+                local = local.reshape(-1, 2)
+                per_vertex = np.bincount(local.ravel(), minlength=len(boundary_vertices))
+                for v_idx, count in zip(boundary_vertices[per_vertex > 2], per_vertex[per_vertex > 2]):
+                    results["warnings"].append(f"Vertex {v_idx} has {count} boundary edges (max 2 expected).")
+
+                adjacency = defaultdict(list)
+                for a, b in local.tolist():
+                    adjacency[a].append(b)
+                    adjacency[b].append(a)
+
+                visited = set()
+                for start_vertex in adjacency:
+                    if start_vertex in visited:
+                        continue
+                    queue = deque([start_vertex])
+                    hole_vertices = 0
+                    hole_edges_count = 0
+                    while queue:
+                        v = queue.popleft()
+                        if v in visited:
+                            continue
+                        visited.add(v)
+                        hole_vertices += 1
+                        for nbr in adjacency[v]:
+                            if nbr not in visited:
+                                queue.append(nbr)
+                            hole_edges_count += 1
+                    results["holes"].append({
+                        "vertices_count": hole_vertices,
+                        "edges_count": hole_edges_count // 2,
+                    })
+                stage.advance(boundary_count)
+            os.remove(boundary_path)
+
+            if results["holes"]:
+                results["warnings"].append(f"Found {len(results['holes'])} hole(s) in the mesh.")
+
+    return results
+
+
+def save_out_of_core_to_stl(mesh, filename, chunk_size=1_000_000, progress_callback=None):
+    """Stream the mesh to a binary STL file chunk by chunk."""
+    instr = as_instrumentation(progress_callback)
+    F = len(mesh.faces)
+    with instr.stage("Exporting STL", total=F) as stage:
+        with open(filename, "wb") as f:
+            f.write(b"Out-of-core mesh export".ljust(80, b" "))
+            f.write(np.array([F], dtype="<u4").tobytes())
+            for start in range(0, F, chunk_size):
+                tri = mesh.points[np.asarray(mesh.faces[start:start + chunk_size])]
+                records = np.zeros(len(tri), dtype=STL_RECORD)
+                records["vectors"] = tri
+                records["normal"] = unit_face_normals(tri.astype(np.float32))
+                records.tofile(f)
+                stage.add_bytes(records.nbytes)
+                stage.advance(len(tri))
+    print(f"✅ STL file saved to {filename}")
+
+
+def save_out_of_core_to_json(mesh, filename, chunk_size=100_000, progress_callback=None):
+    """
+    Stream the mesh to JSON in the layout of mesh_export.save_mesh_to_json.
+    Per-vertex triangle_indices and vertex normals are not stored out of core
+    and are written as empty list / null.
+    """
+    instr = as_instrumentation(progress_callback)
+    V, E, F = len(mesh.points), len(mesh.edges), len(mesh.faces)
+
+    def write_items(f, key, total, make_items, last=False):
+        f.write(f'  "{key}": [')
+        first = True
+        with instr.stage(f"Serializing {key}", total=total) as stage:
+            for start in range(0, total, chunk_size):
+                for item in make_items(start, min(total, start + chunk_size)):
+                    f.write(("\n    " if first else ",\n    ") + json.dumps(item))
+                    first = False
+                stage.advance(min(chunk_size, total - start))
+        f.write("\n  ]" + ("\n" if last else ",\n"))
+
+    def vertex_items(lo, hi):
+        coords = np.asarray(mesh.points[lo:hi], dtype=float).tolist()
+        valence = np.asarray(mesh.valence[lo:hi]).tolist()
+        for i in range(hi - lo):
+            yield {"index": lo + i, "coords": coords[i], "valence": valence[i], "normal": None, "triangle_indices": []}
+
+    def edge_items(lo, hi):
+        edges = np.asarray(mesh.edges[lo:hi]).tolist()
+        faces = np.asarray(mesh.edge_faces[lo:hi]).tolist()
+        for (v1, v2), tris in zip(edges, faces):
+            yield {"v1": v1, "v2": v2, "triangles": [t for t in tris if t >= 0]}
+
+    def triangle_items(lo, hi):
+        faces = np.asarray(mesh.faces[lo:hi])
+        normals = unit_face_normals(np.asarray(mesh.points[faces], dtype=float)).tolist()
+        face_edges = np.asarray(mesh.face_edges[lo:hi]).tolist()
+        for i, vids in enumerate(faces.tolist()):
+            yield {"index": lo + i, "vertex_indices": vids, "edge_indices": face_edges[i], "normal": normals[i]}
+
+    with instr.stage("Exporting JSON"):
+        with open(filename, "w") as f:
+            f.write("{\n")
+            write_items(f, "vertices", V, vertex_items)
+            write_items(f, "edges", E, edge_items)
+            write_items(f, "triangles", F, triangle_items, last=True)
+            f.write("}")
+    print(f"✅ Mesh data saved to {filename}")
@@ -0,0 +1,253 @@
+"""
+Isotropic remeshing of array meshes towards a target edge length
+(Botsch & Kobbelt, "A Remeshing Approach to Multiresolution Modeling", 2004).
+
+Every pass works on whole arrays. Split, collapse and flip passes run in
+rounds; each round picks an independent set of operations (no two touching
+the same faces or vertices) by letting every face or vertex claim its
+highest-priority candidate, and applies the whole set at once.
+"""
+import numpy as np
+
+from mesh_data_structure import remove_unused_vertices
+from mesh_instrumentation import as_instrumentation
+from mesh_spatial import TriangleGrid
+from mesh_topology import (
+    MeshTopology, claim_independent, collapse_allowed, edge_lengths, expand_rows, face_area_normals,
+    priority_rank, quality_drops, triangle_quality,
+)
+
+
+def split_long_edges(points, faces, max_length, max_rounds=100):
+    """Split every edge longer than max_length at its midpoint. Returns (points, faces)."""
+    for _ in range(max_rounds):
+        topo = MeshTopology(faces, len(points))
+        lengths = edge_lengths(points, topo.edges)
+        long = lengths > max_length
+        if not np.any(long):
+            break
+
+        # Each face claims its longest long edge; an edge is split when all its faces claimed it.
+        rank = priority_rank(-lengths)
+        half_rank = np.where(long[topo.edge_of_half], rank[topo.edge_of_half], len(rank)).reshape(-1, 3)
+        local = np.argmin(half_rank, axis=1)
+        claimed_half = 3 * np.arange(len(faces)) + local
+        has_claim = half_rank[np.arange(len(faces)), local] < len(rank)
+        face_edge = np.where(has_claim, topo.edge_of_half[claimed_half], -1)
+        face_of_half = np.repeat(np.arange(len(faces)), 3)
+        lost = face_edge[face_of_half] != topo.edge_of_half
+        selected = long & (np.bincount(topo.edge_of_half[lost], minlength=len(long)) == 0)
+
+        sel = np.flatnonzero(selected)
+        new_index = np.full(len(long), -1, dtype=np.int64)
+        new_index[sel] = len(points) + np.arange(len(sel))
+        midpoints = 0.5 * (points[topo.edges[sel, 0]] + points[topo.edges[sel, 1]])
+        points = np.vstack([points, midpoints])
+
+        # Face (a, b, c) split on edge (a, b) becomes (a, m, c) + (m, b, c).
+        split_faces = np.flatnonzero(has_claim & selected[np.maximum(face_edge, 0)])
+        k = local[split_faces]
+        a = faces[split_faces, k]
+        b = faces[split_faces, (k + 1) % 3]
+        c = faces[split_faces, (k + 2) % 3]
+        m = new_index[face_edge[split_faces]]
+        faces = faces.copy()
+        faces[split_faces] = np.stack([a, m, c], axis=1)
+        faces = np.vstack([faces, np.stack([m, b, c], axis=1)])
+    return points, faces
+
+
+# Passes may not push a triangle below this quality (or below its current one, if lower).
+_MIN_QUALITY = 0.3
+
+
+def collapse_short_edges(points, faces, min_length, max_length, max_rounds=50, min_batch=0.02, seed=0,
+                         chunk_size=200_000):
+    """
+    Collapse edges shorter than min_length, unless that would create an edge
+    longer than max_length, break manifoldness, flip a face or move the boundary.
+    Rounds stop once fewer than min_batch of the first round's candidates are
+    left; the next remeshing iteration picks up the rest.
+    Removed vertices are left unreferenced. Returns (points, faces).
+    """
+    rng = np.random.default_rng(seed)
+    points = points.copy()
+    first = None
+    for _ in range(max_rounds):
+        topo = MeshTopology(faces, len(points))
+        lengths = edge_lengths(points, topo.edges)
+        cand = np.flatnonzero((lengths < min_length) & (topo.counts <= 2))
+        a, b = topo.edges[cand, 0], topo.edges[cand, 1]
+        la, lb = topo.locked[a], topo.locked[b]
+        # Boundary and non-manifold vertices never move or disappear, so an edge
+        # between two of them cannot collapse (on the boundary or across it).
+        valid = ~(la & lb)
+        # Remove b; a locked vertex always survives in place.
+        swap = lb & ~la
+        a, b = np.where(swap, b, a), np.where(swap, a, b)
+        target = np.where((la | lb)[:, None], points[a], 0.5 * (points[a] + points[b]))
+
+        for start in range(0, len(cand), chunk_size):
+            part = slice(start, start + chunk_size)
+            valid[part] &= collapse_allowed(points, faces, topo, cand[part], a[part], b[part], target[part], max_length,
+                                            _MIN_QUALITY)
+
+        cand, a, b, target = cand[valid], a[valid], b[valid], target[valid]
+        first = len(cand) if first is None else first
+        if len(cand) == 0 or len(cand) < min_batch * first:
+            break
+
+        # Disjoint stars: each face goes to one collapse touching it. Random
+        # priorities give much larger independent sets than sorting by length.
+        rank = priority_rank(rng.random(len(cand)))
+        owner_a, f_a = expand_rows(*topo.vertex_faces, a)
+        owner_b, f_b = expand_rows(*topo.vertex_faces, b)
+        selected = claim_independent(np.concatenate([owner_a, owner_b]), np.concatenate([f_a, f_b]), rank, len(faces))
+        a, b, target = a[selected], b[selected], target[selected]
+
+        points[a] = target
+        remap = np.arange(len(points))
+        remap[b] = a
+        faces = remap[faces]
+        faces = faces[(faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) & (faces[:, 2] != faces[:, 0])]
+    return points, faces
+
+
+def flip_edges_to_valence(points, faces, max_rounds=10, seed=0):
+    """
+    Flip interior edges when that brings the valences of the four quad
+    vertices closer to 6 (4 on the boundary). Returns the new faces.
+    """
+    rng = np.random.default_rng(seed)
+    for _ in range(max_rounds):
+        topo = MeshTopology(faces, len(points))
+        cand = np.flatnonzero(topo.counts == 2)
+        h0, h1 = topo.half0[cand], topo.half1[cand]
+        flat = faces.ravel()
+        a = flat[h0]
+        b = flat[3 * (h0 // 3) + (h0 % 3 + 1) % 3]
+        c = topo.opposite(h0)
+        d = topo.opposite(h1)
+
+        target = np.where(topo.boundary, 4, 6)
+        quad = np.stack([a, b, c, d], axis=1)
+        before = np.abs(topo.valence[quad] - target[quad]).sum(axis=1)
+        after = np.abs(topo.valence[quad] + np.array([-1, -1, 1, 1]) - target[quad]).sum(axis=1)
+        gain = before - after
+        valid = (gain > 0) & (c != d) & ~topo.has_edge(c, d)
+        valid &= (topo.valence[a] > 3) & (topo.valence[b] > 3)
+        cand, quad, gain, h0, h1 = cand[valid], quad[valid], gain[valid], h0[valid], h1[valid]
+        a, b, c, d = quad.T
+
+        # The new triangles (a, d, c) and (d, b, c) must face the same way as the old pair.
+        old = face_area_normals(points, faces[h0 // 3]) + face_area_normals(points, faces[h1 // 3])
+        n1 = face_area_normals(points, np.stack([a, d, c], axis=1))
+        n2 = face_area_normals(points, np.stack([d, b, c], axis=1))
+        valid = (np.einsum("ij,ij->i", n1, old) > 0) & (np.einsum("ij,ij->i", n2, old) > 0)
+        valid &= np.einsum("ij,ij->i", n1, n2) > 0
+        # Valence alone happily flips next to fixed boundary vertices into slivers.
+        old_min = np.minimum(triangle_quality(points[faces[h0 // 3]]), triangle_quality(points[faces[h1 // 3]]))
+        new_min = np.minimum(triangle_quality(points[np.stack([a, d, c], axis=1)]), triangle_quality(points[np.stack([d, b, c], axis=1)]))
+        valid &= new_min >= np.minimum(old_min, _MIN_QUALITY)
+
+        cand, quad, gain = cand[valid], quad[valid], gain[valid]
+        if len(cand) == 0:
+            break
+        # Largest gain first, random among equal gains.
+        rank = priority_rank(rng.random(len(cand)) - gain)
+        owner = np.repeat(np.arange(len(cand)), 4)
+        selected = claim_independent(owner, quad.ravel(), rank, len(points))
+        cand, quad = cand[selected], quad[selected]
+        a, b, c, d = quad.T
+
+        faces = faces.copy()
+        faces[topo.half0[cand] // 3] = np.stack([a, d, c], axis=1)
+        faces[topo.half1[cand] // 3] = np.stack([d, b, c], axis=1)
+    return faces
+
+
+def _undo_worsening_moves(old_points, new_points, faces, min_quality=_MIN_QUALITY, max_rounds=5):
+    """Put back moved vertices of faces that quality_drops() flags, until none are left."""
+    points = new_points.copy()
+    for _ in range(max_rounds):
+        bad = quality_drops(old_points[faces], points[faces], min_quality)
+        corners = faces[bad].ravel()
+        corners = corners[np.any(points[corners] != old_points[corners], axis=1)]
+        if len(corners) == 0:
+            break
+        points[corners] = old_points[corners]
+    return points
+
+
+def tangential_relaxation(points, faces):
+    """
+    Move every free vertex towards the centroid of its neighbours, within its
+    tangent plane. Boundary and non-manifold vertices stay put, and moves that
+    would turn a face into a sliver are undone. Returns new points.
+    """
+    topo = MeshTopology(faces, len(points))
+    e0, e1 = topo.edges[:, 0], topo.edges[:, 1]
+    V = len(points)
+    degree = np.bincount(topo.edges.ravel(), minlength=V)
+    centroid = np.stack([
+        np.bincount(e0, weights=points[e1, k], minlength=V) + np.bincount(e1, weights=points[e0, k], minlength=V)
+        for k in range(3)
+    ], axis=1) / np.maximum(degree, 1)[:, None]
+
+    face_normals = face_area_normals(points, faces)
+    normals = np.stack([
+        np.bincount(faces.ravel(), weights=np.repeat(face_normals[:, k], 3), minlength=V) for k in range(3)
+    ], axis=1)
+    lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+    normals /= np.where(lengths == 0, 1.0, lengths)
+
+    move = centroid - points
+    move -= normals * np.einsum("ij,ij->i", move, normals)[:, None]
+    free = (degree > 0) & ~topo.locked
+    moved = points.copy()
+    moved[free] += move[free]
+    return _undo_worsening_moves(points, moved, faces)
+
+
+def isotropic_remesh(points, faces, target_length=None, iterations=5, project=True, progress_callback=None):
+    """
+    Remesh towards equilateral triangles with edges of target_length
+    (defaults to the current mean edge length). Each iteration splits edges
+    longer than 4/3 target, collapses edges shorter than 4/5 target, flips
+    edges towards valence 6, relaxes vertices tangentially and projects them
+    back onto the input surface. Boundary vertices never move or disappear
+    (long boundary edges are still split at their midpoints), and no pass
+    turns a triangle into a sliver of quality below 0.3.
+    Returns (points, faces).
+    """
+    instr = as_instrumentation(progress_callback)
+    points = np.asarray(points, dtype=float)
+    faces = np.asarray(faces, dtype=np.int64)
+    if len(faces) == 0:
+        return points, faces
+    if target_length is None:
+        target_length = float(edge_lengths(points, MeshTopology(faces, len(points)).edges).mean())
+    max_length = 4.0 / 3.0 * target_length
+    min_length = 4.0 / 5.0 * target_length
+
+    grid = None
+    if project:
+        with instr.stage("Indexing original surface"):
+            grid = TriangleGrid(points, faces)
+
+    for it in range(iterations):
+        with instr.stage(f"Remeshing iteration {it + 1}/{iterations}", total=5) as stage:
+            points, faces = split_long_edges(points, faces, max_length)
+            stage.advance(1)
+            points, faces = collapse_short_edges(points, faces, min_length, max_length)
+            points, faces = remove_unused_vertices(points, faces)
+            stage.advance(1)
+            faces = flip_edges_to_valence(points, faces)
+            stage.advance(1)
+            points = tangential_relaxation(points, faces)
+            stage.advance(1)
+            if grid is not None:
+                points = _undo_worsening_moves(points, grid.closest_points(points)[1], faces)
+            stage.advance(1)
+    instr.message(f"Remeshed to {len(points)} vertices, {len(faces)} faces")
+    return points, faces
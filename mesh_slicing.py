@@ -0,0 +1,139 @@
+"""
+Slice a mesh with many horizontal planes into contour polylines.
+
+Faces are ordered by their z-extent and every face is matched to the range
+of layer heights it spans in a single sweep, so each plane only intersects
+its active faces. Crossing points are computed once per (layer, edge) from
+the mesh edge table, which makes the segments of neighbouring faces share
+exact endpoints; chaining them is then a matter of following edge ids.
+"""
+import numpy as np
+
+from mesh_instrumentation import as_instrumentation
+
+
+def layer_heights(z_min, z_max, layer_height):
+    """Mid-layer cutting heights for layers of layer_height between z_min and z_max."""
+    return np.arange(z_min + 0.5 * layer_height, z_max, layer_height)
+
+
+def _list_rank(pred):
+    """
+    Pointer-jumping list ranking on predecessor links (-1 = chain head).
+    Returns (head of each element's chain, distance from that head).
+    """
+    n = len(pred)
+    idx = np.arange(n)
+    rank = (pred >= 0).astype(np.int64)
+    head = np.where(pred >= 0, pred, idx)
+    link = pred.copy()
+    while np.any(link >= 0):
+        valid = link >= 0
+        step = np.where(valid, link, idx)
+        rank = rank + np.where(valid, rank[step], 0)
+        head = head[head]
+        link = np.where(valid, link[step], -1)
+    return head, rank
+
+
+def slice_mesh(mesh, layer_height=None, heights=None, progress_callback=None):
+    """
+    Cut a LazyMesh with horizontal planes.
+    heights: explicit plane heights; otherwise planes are spaced layer_height
+    apart through the middle of each layer.
+    Returns one dict per plane: {"z": height, "contours": [K x 2 xy arrays],
+    "closed": [bool per contour]}. Closed contours do not repeat their first point;
+    open ones appear where the plane crosses a hole.
+    """
+    instr = as_instrumentation(progress_callback)
+    points = np.asarray(mesh.points, dtype=float)
+    faces = np.asarray(mesh.faces, dtype=np.int64)
+    z = points[:, 2]
+    if heights is None:
+        if layer_height is None:
+            raise ValueError("Give either layer_height or heights.")
+        heights = layer_heights(z.min(), z.max(), layer_height) if len(z) else np.zeros(0)
+    heights = np.sort(np.asarray(heights, dtype=float))
+    layers = [{"z": float(h), "contours": [], "closed": []} for h in heights]
+    if len(faces) == 0 or len(heights) == 0:
+        return layers
+
+    edges = mesh.edges
+    face_edges = mesh.face_edges  # edge opposite each corner
+    E = len(edges)
+
+    with instr.stage("Sweeping layers", total=len(faces)) as stage:
+        # A vertex counts as above a plane when z >= h, so a face is cut by every
+        # plane with z_min < h <= z_max and never by a plane through a lone vertex.
+        face_z = z[faces]
+        z_lo, z_hi = face_z.min(axis=1), face_z.max(axis=1)
+        order = np.argsort(z_lo, kind="stable")
+        first = np.searchsorted(heights, z_lo[order], side="right")
+        last = np.searchsorted(heights, z_hi[order], side="right")
+        counts = np.maximum(last - first, 0)
+        pair_face = np.repeat(order, counts)
+        pair_layer = np.repeat(first - (np.cumsum(counts) - counts), counts) + np.arange(counts.sum())
+        stage.advance(len(faces))
+
+    with instr.stage("Intersecting faces", total=len(pair_face)) as stage:
+        below = face_z[pair_face] < heights[pair_layer][:, None]  # pairs x 3
+        # Half-edge j runs from corner j to corner j + 1 and lies on the edge opposite corner j + 2.
+        start_below = below
+        end_below = below[:, [1, 2, 0]]
+        going_down = ~start_below & end_below
+        going_up = start_below & ~end_below
+        # Exactly one half-edge goes down and one goes up; the segment runs from the
+        # downward crossing to the upward one, which makes outer contours counter-clockwise.
+        j_down = np.argmax(going_down, axis=1)
+        j_up = np.argmax(going_up, axis=1)
+        edge_down = face_edges[pair_face, (j_down + 2) % 3]
+        edge_up = face_edges[pair_face, (j_up + 2) % 3]
+        from_key = pair_layer * E + edge_down
+        to_key = pair_layer * E + edge_up
+        stage.advance(len(pair_face))
+
+    with instr.stage("Chaining contours", total=len(from_key)) as stage:
+        S = len(from_key)
+        by_from = np.argsort(from_key, kind="stable")
+        sorted_from = from_key[by_from]
+        pos = np.minimum(np.searchsorted(sorted_from, to_key), max(S - 1, 0))
+        succ = np.where(sorted_from[pos] == to_key, by_from[pos], -1)
+        pred = np.full(S, -1, dtype=np.int64)
+        has_succ = succ >= 0
+        pred[succ[has_succ]] = np.flatnonzero(has_succ)
+
+        # Closed loops have no head: cut each one at its smallest segment index.
+        label = np.arange(S)
+        jump = np.where(has_succ, succ, label)
+        for _ in range(int(np.ceil(np.log2(max(S, 2)))) + 1):
+            label = np.minimum(label, label[jump])
+            jump = jump[jump]
+        cyclic = succ[jump] >= 0
+        cut = cyclic & (label == np.arange(S))
+        pred[cut] = -1
+
+        head, rank = _list_rank(pred)
+        seq = np.lexsort((rank, head))
+        stage.advance(S)
+
+    with instr.stage("Building polylines", total=S) as stage:
+        def crossing(keys):
+            layer, edge = np.divmod(keys, E)
+            a, b = edges[edge, 0], edges[edge, 1]
+            t = (heights[layer] - z[a]) / (z[b] - z[a])
+            return points[a, :2] + t[:, None] * (points[b, :2] - points[a, :2])
+
+        xy = crossing(from_key[seq])
+        seq_head = head[seq]
+        starts = np.flatnonzero(np.r_[True, seq_head[1:] != seq_head[:-1]])
+        ends = np.r_[starts[1:], S]
+        tails = crossing(to_key[seq[ends - 1]])
+        closed = cyclic[seq[starts]]
+        contour_layer = pair_layer[seq[starts]]
+        for k, (lo, hi) in enumerate(zip(starts.tolist(), ends.tolist())):
+            contour = xy[lo:hi] if closed[k] else np.vstack([xy[lo:hi], tails[k]])
+            layer = layers[contour_layer[k]]
+            layer["contours"].append(contour)
+            layer["closed"].append(bool(closed[k]))
+        stage.advance(S)
+    return layers
@@ -0,0 +1,472 @@
+"""
+Spatial index for bulk closest-point queries against a triangle mesh.
+
+Triangles are binned into a hashed uniform grid. Queries search their own
+cell first and then growing shells of neighbouring cells, stopping as soon
+as the best distance found is provably the closest. Triangles much larger
+than a cell, and queries too far away for the grid, go through a bounding
+volume hierarchy instead. All work is done on numpy arrays in chunks, so millions
+of queries take seconds.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from mesh_data_structure import expand_ranges
+
+
+def closest_points_on_triangles(p, a, b, c):
+    """
+    Closest point on each triangle (a, b, c) to p; all arguments are K x 3.
+    Vectorized version of the Voronoi-region test from Ericson,
+    "Real-Time Collision Detection", 5.1.5.
+    """
+    def dot(u, v):
+        return np.einsum("ij,ij->i", u, v)
+
+    def safe_div(n, d):
+        return n / np.where(d == 0, 1.0, d)
+
+    ab, ac, ap = b - a, c - a, p - a
+    d1, d2 = dot(ab, ap), dot(ac, ap)
+    bp = p - b
+    d3, d4 = dot(ab, bp), dot(ac, bp)
+    cp = p - c
+    d5, d6 = dot(ab, cp), dot(ac, cp)
+
+    va = d3 * d6 - d5 * d4
+    vb = d5 * d2 - d1 * d6
+    vc = d1 * d4 - d3 * d2
+
+    # Interior by default.
+    denom = safe_div(1.0, va + vb + vc)
+    v = vb * denom
+    w = vc * denom
+    result = a + ab * v[:, None] + ac * w[:, None]
+
+    # Edge regions, then vertex regions (later assignments take precedence).
+    on_bc = (va <= 0) & (d4 - d3 >= 0) & (d5 - d6 >= 0)
+    t = safe_div(d4 - d3, (d4 - d3) + (d5 - d6))
+    result = np.where(on_bc[:, None], b + (c - b) * t[:, None], result)
+
+    on_ac = (vb <= 0) & (d2 >= 0) & (d6 <= 0)
+    t = safe_div(d2, d2 - d6)
+    result = np.where(on_ac[:, None], a + ac * t[:, None], result)
+
+    on_ab = (vc <= 0) & (d1 >= 0) & (d3 <= 0)
+    t = safe_div(d1, d1 - d3)
+    result = np.where(on_ab[:, None], a + ab * t[:, None], result)
+
+    result = np.where(((d6 >= 0) & (d5 <= d6))[:, None], c, result)
+    result = np.where(((d3 >= 0) & (d4 <= d3))[:, None], b, result)
+    result = np.where(((d1 <= 0) & (d2 <= 0))[:, None], a, result)
+    return result
+
+
+def _spread_bits(x):
+    """Spread the low 21 bits of x so that two zero bits separate each bit (Morton encoding)."""
+    x = x.astype(np.uint64) & np.uint64(0x1FFFFF)
+    x = (x | (x << np.uint64(32))) & np.uint64(0x1F00000000FFFF)
+    x = (x | (x << np.uint64(16))) & np.uint64(0x1F0000FF0000FF)
+    x = (x | (x << np.uint64(8))) & np.uint64(0x100F00F00F00F00F)
+    x = (x | (x << np.uint64(4))) & np.uint64(0x10C30C30C30C30C3)
+    x = (x | (x << np.uint64(2))) & np.uint64(0x1249249249249249)
+    return x
+
+
+def morton_codes(xyz):
+    """63-bit Morton (Z-order) codes of points quantized to a 2^21 grid over their bounding cube."""
+    lo = xyz.min(axis=0)
+    extent = max(float((xyz.max(axis=0) - lo).max()), 1e-300)
+    cells = np.minimum(((xyz - lo) / extent * 2**21).astype(np.int64), 2**21 - 1)
+    return _spread_bits(cells[:, 0]) | (_spread_bits(cells[:, 1]) << np.uint64(1)) | (_spread_bits(cells[:, 2]) << np.uint64(2))
+
+
+def map_chunks(func, queries, chunk_size, workers=None):
+    """
+    Apply func to consecutive chunks of queries on a thread pool (numpy
+    releases the GIL); workers=None uses all cores. Returns the list of results in order.
+    """
+    chunks = [queries[start:start + chunk_size] for start in range(0, len(queries), chunk_size)]
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and len(chunks) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(func, chunks))
+    return [func(chunk) for chunk in chunks]
+
+
+def _shell_offsets(r):
+    """Integer cell offsets with Chebyshev distance exactly r."""
+    rng = np.arange(-r, r + 1)
+    grid = np.stack(np.meshgrid(rng, rng, rng, indexing="ij"), axis=-1).reshape(-1, 3)
+    return grid[np.abs(grid).max(axis=1) == r]
+
+
+def _box_distance2(p, lo, hi):
+    """Squared distance from each point to its axis-aligned box (0 inside); all K x 3."""
+    gap = np.maximum(lo - p, 0) + np.maximum(p - hi, 0)
+    return np.einsum("ij,ij->i", gap, gap)
+
+
+def _slab_distance2(p, lo, hi, normal, t0, t1):
+    """
+    Squared lower bound on the distance from each point to geometry lying both in
+    its box (lo, hi) and between the planes normal . x = t0 and normal . x = t1
+    (unit normals); all K x 3 or K. The geometry is within half the slab thickness
+    of the mid plane, so a point is at least its distance to the slab away, plus
+    the distance from its foot on the mid plane to the box, less that half
+    thickness. For nearly flat patches seen from afar this is far tighter than
+    the box alone.
+    """
+    s = np.einsum("ij,ij->i", p, normal) - 0.5 * (t0 + t1)
+    half = 0.5 * (t1 - t0)
+    gap = np.maximum(np.abs(s) - half, 0)
+    side = np.maximum(np.sqrt(_box_distance2(p - s[:, None] * normal, lo, hi)) - half, 0)
+    return np.maximum(_box_distance2(p, lo, hi), gap * gap + side * side)
+
+
+def _segment_min(keys, values):
+    """Minimum of values per run of equal keys; returns (keys, minima) with one entry per run."""
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    return keys[starts], np.minimum.reduceat(values, starts)
+
+
+def _update_best(q, pair_q, pair_t, a, b, c, best_d2, best_p, best_f):
+    """
+    Evaluate (query, triangle) candidate pairs, grouped by query, exactly against
+    the triangles (a, b, c) and keep the best per query in best_d2 / best_p / best_f.
+    """
+    if len(pair_q) == 0:
+        return
+    cp = closest_points_on_triangles(q[pair_q], a[pair_t], b[pair_t], c[pair_t])
+    diff = cp - q[pair_q]
+    d2 = np.einsum("ij,ij->i", diff, diff)
+    # Pairs arrive grouped by query, so each query is one contiguous segment.
+    seg_start = np.flatnonzero(np.r_[True, pair_q[1:] != pair_q[:-1]])
+    seg_min = np.minimum.reduceat(d2, seg_start)
+    seg_len = np.diff(np.r_[seg_start, len(d2)])
+    hits = np.flatnonzero(d2 == np.repeat(seg_min, seg_len))
+    pick = hits[np.r_[True, pair_q[hits[1:]] != pair_q[hits[:-1]]]]
+    improved = d2[pick] < best_d2[pair_q[pick]]
+    target = pair_q[pick][improved]
+    best_d2[target] = d2[pick][improved]
+    best_p[target] = cp[pick][improved]
+    best_f[target] = pair_t[pick][improved]
+
+
+# Largest node (in triangles) that gets a slab besides its box.
+_FLAT_SIZE = 1024
+
+
+def _slabs(tri, area_normals, size):
+    """
+    Slab (normal, t0, t1) around every run of size consecutive triangles of the
+    F x 3 x 3 array tri: the run's unit mean normal (any axis if the normals cancel)
+    and the range of normal . x over its corners, padded against rounding.
+    """
+    if len(tri) == 0:
+        return np.zeros((0, 3)), np.zeros(0), np.zeros(0)
+    starts = np.arange(0, len(tri), size)
+    normal = np.add.reduceat(area_normals, starts)
+    normal[~np.any(normal, axis=1)] = [0.0, 0.0, 1.0]
+    normal /= np.linalg.norm(normal, axis=1)[:, None]
+    t = np.einsum("fkd,fd->fk", tri, np.repeat(normal, size, axis=0)[:len(tri)])
+    pad = 1e-12 * float(np.abs(tri).max())
+    return normal, np.minimum.reduceat(t.min(axis=1), starts) - pad, np.maximum.reduceat(t.max(axis=1), starts) + pad
+
+
+class TriangleBVH:
+    """
+    Bounding volume hierarchy over the triangles of (points, faces).
+    Triangles are sorted by the Morton code of their centroid and cut into leaves
+    of leaf_size consecutive triangles; each level above pairs up consecutive
+    nodes of the level below (node i has children 2i and 2i + 1). Every node
+    keeps its box, one corner on the surface (for upper bounds) and, up to
+    _FLAT_SIZE triangles, a slab, so memory is linear in the face count however
+    large individual triangles are.
+    """
+
+    def __init__(self, points, faces, leaf_size=8):
+        self.points = np.asarray(points, dtype=float)
+        self.faces = np.asarray(faces, dtype=np.int64)
+        self.leaf_size = leaf_size
+        tri = self.points[self.faces]
+        self._order = np.arange(len(tri))
+        if len(tri):
+            self._order = np.argsort(morton_codes(tri.mean(axis=1)), kind="stable")
+            tri = tri[self._order]
+        self._a, self._b, self._c = tri[:, 0], tri[:, 1], tri[:, 2]
+        self._box_lo, self._box_hi = tri.min(axis=1), tri.max(axis=1)
+
+        # levels[0] holds the leaves, levels[-1] the root. Slabs t0 <= normal . x <= t1
+        # around the triangles are kept per triangle too (see _slab_distance2).
+        area_normals = np.cross(self._b - self._a, self._c - self._a)
+        self._slab = _slabs(tri, area_normals, 1)
+        lo, hi = self._box_lo, self._box_hi
+        size = leaf_size
+        self.levels = []
+        while not self.levels or len(lo) > 1:
+            if len(tri):
+                starts = np.arange(0, len(lo), 2 if self.levels else leaf_size)
+                lo, hi = np.minimum.reduceat(lo, starts), np.maximum.reduceat(hi, starts)
+            # Larger nodes are too curved for a slab to beat their box.
+            slab = _slabs(tri, area_normals, size) if size <= _FLAT_SIZE else None
+            # The first corner of the middle triangle represents the node.
+            middle = np.minimum(np.arange(len(lo)) * size + size // 2, len(tri) - 1)
+            self.levels.append((lo, hi, slab, self._a[middle]))
+            size *= 2
+
+    def _visit_leaves(self, q, pair_q, leaf, limit, best_d2, best_p, best_f):
+        """Test the triangles of (query, leaf) pairs whose bounds come within limit."""
+        start = leaf * self.leaf_size
+        owner, tri = expand_ranges(start, np.minimum(self.leaf_size, len(self._a) - start))
+        pair_q = pair_q[owner]
+        slab = (x[tri] for x in self._slab)
+        near = _slab_distance2(q[pair_q], self._box_lo[tri], self._box_hi[tri], *slab) <= limit[pair_q]
+        _update_best(q, pair_q[near], tri[near], self._a, self._b, self._c, best_d2, best_p, best_f)
+
+    def closest_points(self, queries, chunk_size=25_000, workers=None):
+        """
+        Exact closest surface point for every query point.
+        Chunks are processed on a thread pool (see map_chunks).
+        Returns (distances Q, closest points Q x 3, face index Q).
+        """
+        queries = np.asarray(queries, dtype=float).reshape(-1, 3)
+        Q = len(queries)
+        distances = np.full(Q, np.inf)
+        closest = np.zeros((Q, 3))
+        face_ids = np.full(Q, -1, dtype=np.int64)
+        if len(self.faces) == 0 or Q == 0:
+            return distances, closest, face_ids
+
+        results = map_chunks(self._query_chunk, queries, chunk_size, workers)
+        for start, (d2, p, f) in zip(range(0, Q, chunk_size), results):
+            distances[start:start + len(d2)] = np.sqrt(d2)
+            closest[start:start + len(d2)] = p
+            face_ids[start:start + len(d2)] = f
+        return distances, closest, face_ids
+
+    def _query_chunk(self, q, bound=None, max_pairs=2**18):
+        """
+        Closest points for one chunk of queries; returns (squared distances, points, faces).
+        bound: squared distances already known to be reachable; queries with nothing
+        closer get face -1. At most max_pairs (query, node) pairs are expanded
+        at once, which bounds memory when many leaves are about equally far away
+        (e.g. from the centre of a sphere).
+        """
+        n = len(q)
+        best_d2 = np.full(n, np.inf)
+        best_p = np.zeros((n, 3))
+        best_f = np.full(n, -1, dtype=np.int64)
+        # Squared search radius: the best triangle so far, or closer.
+        limit = np.full(n, np.inf) if bound is None else np.array(bound, dtype=float)
+
+        stack = [(len(self.levels) - 1, np.arange(n), np.zeros(n, dtype=np.int64))]
+        while stack:
+            level, pair_q, node = stack.pop()
+            lo, hi, slab, rep = self.levels[level]
+            if slab is None:
+                lower = _box_distance2(q[pair_q], lo[node], hi[node])
+            else:
+                lower = _slab_distance2(q[pair_q], lo[node], hi[node], *(x[node] for x in slab))
+            keep = lower <= limit[pair_q]
+            pair_q, node = pair_q[keep], node[keep]
+            if len(pair_q):
+                # Each node's representative corner lies on the surface, so the nearest
+                # one bounds the search.
+                diff = q[pair_q] - rep[node]
+                owner, reach = _segment_min(pair_q, np.einsum("ij,ij->i", diff, diff))
+                limit[owner] = np.minimum(limit[owner], reach)
+            if level == 0:
+                self._visit_leaves(q, pair_q, node, limit, best_d2, best_p, best_f)
+                np.minimum(limit, best_d2, out=limit)
+                continue
+            n_below = len(self.levels[level - 1][0])
+            owner, node = expand_ranges(2 * node, np.minimum(n_below - 2 * node, 2))
+            pair_q = pair_q[owner]
+            # Pairs stay grouped by query; push the slices so the first is handled first.
+            for start in reversed(range(0, len(pair_q), max_pairs)):
+                stack.append((level - 1, pair_q[start:start + max_pairs], node[start:start + max_pairs]))
+        found = best_f >= 0
+        best_f[found] = self._order[best_f[found]]
+        return best_d2, best_p, best_f
+
+
+class TriangleGrid:
+    """
+    Hashed uniform grid over the triangles of (points, faces).
+    cell_size defaults to the mean edge length, which keeps a few triangles per cell.
+    A triangle is binned into every cell its bounding box overlaps, up to max_cells;
+    larger triangles go into a TriangleBVH instead, so a few huge faces cannot
+    make the grid grow with the cube of their size.
+    """
+
+    def __init__(self, points, faces, cell_size=None, max_cells=27):
+        self.points = np.asarray(points, dtype=float)
+        self.faces = np.asarray(faces, dtype=np.int64)
+        tri = self.points[self.faces]
+        self._a, self._b, self._c = tri[:, 0], tri[:, 1], tri[:, 2]
+        self._box_lo, self._box_hi = tri.min(axis=1), tri.max(axis=1)
+
+        if cell_size is None:
+            edge_lengths = np.linalg.norm(tri - np.roll(tri, 1, axis=1), axis=2)
+            cell_size = float(edge_lengths.mean()) if len(tri) else 1.0
+        extent = (self.points.max(axis=0) - self.points.min(axis=0)).max() if len(self.points) else 1.0
+        # Bound the grid resolution so hashed keys stay small even for tiny cells.
+        self.cell_size = max(cell_size, extent / 2**20, 1e-12)
+        self.origin = self.points.min(axis=0) if len(self.points) else np.zeros(3)
+        self.dims = np.maximum(np.floor((self.points.max(axis=0) - self.origin) / self.cell_size).astype(np.int64) + 1, 1) \
+            if len(self.points) else np.ones(3, dtype=np.int64)
+
+        lo = self._cell_of(self._box_lo)
+        hi = self._cell_of(self._box_hi)
+        span = hi - lo + 1
+        counts = span.prod(axis=1)
+        large = counts > max_cells
+        self._large_ids = np.flatnonzero(large)
+        self._large = TriangleBVH(self.points, self.faces[large]) if len(self._large_ids) else None
+        counts[large] = 0
+        # Offset of each entry within its triangle's cell block.
+        tri_ids, local = expand_ranges(0, counts)
+        s = span[tri_ids]
+        cells = lo[tri_ids] + np.stack([local // (s[:, 1] * s[:, 2]), (local // s[:, 2]) % s[:, 1], local % s[:, 2]], axis=1)
+        keys = self._key(cells)
+
+        order = np.argsort(keys, kind="stable")
+        keys = keys[order]
+        self.cell_triangles = tri_ids[order]
+        self.cell_keys, first = np.unique(keys, return_index=True)
+        self.cell_offsets = np.append(first, len(keys))
+        self._tree = None
+
+    def _cell_of(self, xyz):
+        return np.floor((xyz - self.origin) / self.cell_size).astype(np.int64)
+
+    def _key(self, cells):
+        return (cells[..., 0] * self.dims[1] + cells[..., 1]) * self.dims[2] + cells[..., 2]
+
+    def _lookup(self, keys):
+        """CSR (starts, counts) into cell_triangles for an array of keys (-1 = none)."""
+        pos = np.minimum(np.searchsorted(self.cell_keys, keys), len(self.cell_keys) - 1)
+        found = (keys >= 0) & (self.cell_keys[pos] == keys)
+        starts = np.where(found, self.cell_offsets[pos], 0)
+        counts = np.where(found, self.cell_offsets[pos + 1] - self.cell_offsets[pos], 0)
+        return starts, counts
+
+    def _pairs(self, owner, cells):
+        """Expand (owner, cell) rows into (owner, triangle) candidate pairs."""
+        inside = np.all((cells >= 0) & (cells < self.dims), axis=1)
+        keys = np.where(inside, self._key(cells), -1)
+        starts, counts = self._lookup(keys)
+        row, index = expand_ranges(starts, counts)
+        return owner[row], self.cell_triangles[index]
+
+    def _update(self, q, pair_q, pair_t, best_d2, best_p, best_f):
+        """Evaluate candidate pairs (grouped by query) exactly and keep the best per query."""
+        _update_best(q, pair_q, pair_t, self._a, self._b, self._c, best_d2, best_p, best_f)
+
+    def closest_points(self, queries, chunk_size=25_000, workers=None):
+        """
+        Exact closest surface point for every query point.
+        Chunks are processed on a thread pool (see map_chunks).
+        Returns (distances Q, closest points Q x 3, face index Q).
+        """
+        queries = np.asarray(queries, dtype=float).reshape(-1, 3)
+        Q = len(queries)
+        best_d2 = np.full(Q, np.inf)
+        closest = np.zeros((Q, 3))
+        face_ids = np.full(Q, -1, dtype=np.int64)
+        if len(self.faces) == 0 or Q == 0:
+            return best_d2, closest, face_ids
+
+        results = map_chunks(self._query_chunk, queries, chunk_size, workers)
+        far = []
+        for start, (d2, p, f, unresolved) in zip(range(0, Q, chunk_size), results):
+            best_d2[start:start + len(d2)] = d2
+            closest[start:start + len(d2)] = p
+            face_ids[start:start + len(d2)] = f
+            far.append(start + np.flatnonzero(unresolved))
+        far = np.concatenate(far)
+
+        if len(far):
+            # Too far from the surface for the grid: search a hierarchy over all
+            # triangles instead, starting from whatever bound the grid found.
+            if self._tree is None:
+                self._tree = TriangleBVH(self.points, self.faces)
+
+            def finish(ids):
+                return self._tree._query_chunk(queries[ids], bound=best_d2[ids])
+
+            results = map_chunks(finish, far, chunk_size, workers)
+            for start, (d2, p, f) in zip(range(0, len(far), chunk_size), results):
+                ids = far[start:start + len(d2)]
+                closer = f >= 0
+                best_d2[ids[closer]] = d2[closer]
+                closest[ids[closer]] = p[closer]
+                face_ids[ids[closer]] = f[closer]
+        return np.sqrt(best_d2), closest, face_ids
+
+    def _query_chunk(self, q, max_ring=4, max_box_cells=512):
+        """
+        Closest points for one chunk of queries. Returns (squared distances, points,
+        faces, unresolved): queries with no triangle within max_ring shells, or whose
+        bound spans more than max_box_cells cells, are left for closest_points to
+        finish (their distances so far are upper bounds).
+        """
+        n = len(q)
+        best_d2 = np.full(n, np.inf)
+        best_p = np.zeros((n, 3))
+        best_f = np.full(n, -1, dtype=np.int64)
+        cell = self._cell_of(q)
+        searched = np.full(n, -1, dtype=np.int64)  # shells already searched completely
+        unresolved = np.zeros(n, dtype=bool)
+
+        # Phase 1: an upper bound from the nearest non-empty shell of cells. Queries
+        # more than max_ring cells outside the grid are left unresolved straight away.
+        outside = np.maximum(np.maximum(-cell, cell - (self.dims - 1)), 0).max(axis=1)
+        near = np.flatnonzero(outside <= max_ring)
+        pending = near
+        for r in range(max_ring + 1):
+            offsets = _shell_offsets(r)
+            owner = np.repeat(pending, len(offsets))
+            cells = (cell[pending][:, None, :] + offsets[None, :, :]).reshape(-1, 3)
+            self._update(q, *self._pairs(owner, cells), best_d2, best_p, best_f)
+            searched[pending] = r
+            pending = pending[np.isinf(best_d2[pending])]
+            if len(pending) == 0:
+                break
+        if self._large is not None and len(near):
+            # Triangles too large to bin, searched within the bound found so far.
+            d2, p, f = self._large._query_chunk(q[near], bound=best_d2[near])
+            closer = d2 < best_d2[near]
+            ids = near[closer]
+            best_d2[ids], best_p[ids], best_f[ids] = d2[closer], p[closer], self._large_ids[f[closer]]
+        unresolved |= np.isinf(best_d2)
+
+        # Phase 2: every cell overlapping the ball of the current best distance.
+        bound = np.sqrt(np.where(unresolved, 0.0, best_d2))
+        lo = np.maximum(self._cell_of(q - bound[:, None]), 0)
+        hi = np.minimum(self._cell_of(q + bound[:, None]), self.dims - 1)
+        span = np.maximum(hi - lo + 1, 0)
+        box = span.prod(axis=1)
+        reach = np.maximum(np.abs(lo - cell), np.abs(hi - cell)).max(axis=1)
+        needs_more = ~unresolved & (reach > searched)
+        too_big = needs_more & (box > max_box_cells)
+        unresolved |= too_big
+        todo = np.flatnonzero(needs_more & ~too_big)
+
+        if len(todo):
+            counts = box[todo]
+            row, local = expand_ranges(0, counts)
+            owner = todo[row]
+            s = span[owner]
+            cells = lo[owner] + np.stack([local // (s[:, 1] * s[:, 2]), (local // s[:, 2]) % s[:, 1], local % s[:, 2]], axis=1)
+            # Skip the shells searched in phase 1.
+            fresh = np.abs(cells - cell[owner]).max(axis=1) > searched[owner]
+            pair_q, pair_t = self._pairs(owner[fresh], cells[fresh])
+            # Cheap prune: triangle bounding box must come within the bound.
+            near = _box_distance2(q[pair_q], self._box_lo[pair_t], self._box_hi[pair_t]) < best_d2[pair_q]
+            self._update(q, pair_q[near], pair_t[near], best_d2, best_p, best_f)
+
+        return best_d2, best_p, best_f, unresolved
@@ -0,0 +1,137 @@
+"""
+Edge topology and batched edge-collapse helpers shared by the remeshing
+and decimation passes.
+
+Tables are built from a face array in one go (edges keyed as lo * V + hi,
+CSR adjacency), and operations are chosen in rounds as independent sets:
+every face or vertex is claimed by the best-ranked candidate touching it.
+"""
+import numpy as np
+
+from mesh_data_structure import expand_ranges, group_csr
+
+
+def expand_rows(offsets, values, rows):
+    """Flatten CSR rows: returns (index into rows, value) for every entry of every row."""
+    owner, index = expand_ranges(offsets[rows], offsets[rows + 1] - offsets[rows])
+    return owner, values[index]
+
+
+class MeshTopology:
+    """
+    Edge and adjacency tables of a face array.
+    Half-edge 3 * f + k runs from faces[f, k] to faces[f, (k + 1) % 3].
+    """
+
+    def __init__(self, faces, n_vertices):
+        self.faces = faces
+        self.n_vertices = n_vertices
+        flat = faces.ravel()
+        nxt = faces[:, [1, 2, 0]].ravel()
+        keys = np.minimum(flat, nxt) * n_vertices + np.maximum(flat, nxt)
+        self.edge_keys, self.edge_of_half, self.counts = np.unique(keys, return_inverse=True, return_counts=True)
+        self.edge_of_half = self.edge_of_half.reshape(-1)
+        self.edges = np.stack([self.edge_keys // n_vertices, self.edge_keys % n_vertices], axis=1)
+
+        # The (up to) two half-edges of every edge.
+        order = np.argsort(self.edge_of_half, kind="stable")
+        first = np.cumsum(self.counts) - self.counts
+        self.half0 = order[first]
+        self.half1 = order[np.minimum(first + 1, len(order) - 1)]
+
+        self.valence = np.bincount(self.edges.ravel(), minlength=n_vertices)
+        # Boundary and non-manifold vertices are kept in place.
+        self.locked = np.zeros(n_vertices, dtype=bool)
+        self.locked[self.edges[self.counts != 2].ravel()] = True
+        self.boundary = np.zeros(n_vertices, dtype=bool)
+        self.boundary[self.edges[self.counts == 1].ravel()] = True
+
+        self.neighbors = group_csr(self.edges.ravel(), self.edges[:, ::-1].ravel(), n_vertices)
+        self.vertex_faces = group_csr(flat, np.repeat(np.arange(len(faces)), 3), n_vertices)
+
+    def has_edge(self, u, v):
+        keys = np.minimum(u, v) * self.n_vertices + np.maximum(u, v)
+        pos = np.minimum(np.searchsorted(self.edge_keys, keys), len(self.edge_keys) - 1)
+        return self.edge_keys[pos] == keys
+
+    def opposite(self, half):
+        """Vertex opposite each half-edge in its face."""
+        return self.faces.ravel()[3 * (half // 3) + (half % 3 + 2) % 3]
+
+
+def edge_lengths(points, edges):
+    return np.linalg.norm(points[edges[:, 0]] - points[edges[:, 1]], axis=1)
+
+
+def priority_rank(priority):
+    """Unique integer rank per candidate, 0 = most important (smallest priority)."""
+    rank = np.empty(len(priority), dtype=np.int64)
+    rank[np.argsort(priority, kind="stable")] = np.arange(len(priority))
+    return rank
+
+
+def claim_independent(owner, slot, rank, n_slots):
+    """
+    Independent set selection: every slot (face or vertex) is claimed by the
+    best-ranked candidate touching it; a candidate wins if it holds all its slots.
+    """
+    claims = np.full(n_slots, np.iinfo(np.int64).max)
+    np.minimum.at(claims, slot, rank[owner])
+    lost = claims[slot] != rank[owner]
+    return np.bincount(owner[lost], minlength=len(rank)) == 0
+
+
+def face_area_normals(points, faces):
+    """Unnormalized face normals (cross products, length = twice the area)."""
+    tri = points[faces]
+    return np.cross(tri[:, 1] - tri[:, 0], tri[:, 2] - tri[:, 0])
+
+
+def triangle_quality(corners):
+    """4 sqrt(3) area / sum of squared edge lengths per K x 3 x 3 triangle: 1 = equilateral, 0 = degenerate."""
+    area2 = np.linalg.norm(np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0]), axis=1)
+    squares = sum(((corners[:, k] - corners[:, (k + 1) % 3]) ** 2).sum(axis=1) for k in range(3))
+    return 2.0 * np.sqrt(3.0) * area2 / np.where(squares == 0, 1.0, squares)
+
+
+def quality_drops(old, new, min_quality):
+    """Triangles whose quality drops below min_quality and below their old quality."""
+    return triangle_quality(new) < np.minimum(triangle_quality(old), min_quality)
+
+
+def collapse_allowed(points, faces, topo, cand, a, b, target, max_length, min_quality=0.0):
+    """
+    Topology and geometry checks for collapsing b into a at target.
+    min_quality: reject collapses that turn a surviving face into a sliver.
+    """
+    on_boundary = topo.counts[cand] == 1
+    # Link condition: common neighbours are exactly the opposite vertices.
+    owner, c = expand_rows(*topo.neighbors, a)
+    common = np.bincount(owner[topo.has_edge(b[owner], c)], minlength=len(cand))
+    valid = common == topo.counts[cand]
+    # Opposite vertices must keep a valence of at least 3.
+    valid &= topo.valence[topo.opposite(topo.half0[cand])] > 3
+    valid &= on_boundary | (topo.valence[topo.opposite(topo.half1[cand])] > 3)
+
+    for side in (a, b):
+        # No new edge may be too long.
+        owner, c = expand_rows(*topo.neighbors, side)
+        far = np.linalg.norm(target[owner] - points[c], axis=1) > max_length
+        far &= (c != a[owner]) & (c != b[owner])
+        valid &= np.bincount(owner[far], minlength=len(cand)) == 0
+
+        # Surviving faces around the edge must not flip or degenerate.
+        owner, f = expand_rows(*topo.vertex_faces, side)
+        tri = faces[f]
+        moved = (tri == a[owner, None]) | (tri == b[owner, None])
+        keep = moved.sum(axis=1) == 1
+        owner, tri, moved = owner[keep], tri[keep], moved[keep]
+        old = face_area_normals(points, tri)
+        corners = points[tri]
+        corners[moved] = target[owner]
+        new = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+        flipped = np.einsum("ij,ij->i", old, new) <= 0
+        if min_quality > 0:
+            flipped |= quality_drops(points[tri], corners, min_quality)
+        valid &= np.bincount(owner[flipped], minlength=len(cand)) == 0
+    return valid
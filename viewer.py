@@ -82,4 +82,114 @@ def plot_mesh_with_highlights(vertices, triangles, highlight_edge_indices, edges
 
     plotter.hide_axes()
     plotter.camera_position = 'iso'
-    plotter.show()
\ No newline at end of file
+    plotter.show()
+
+
+def plot_mesh_lod(levels):
+    """
+    Show level-of-detail proxies (list of (points, faces) arrays, finest first).
+    Starts on the coarsest level; the slider switches between levels.
+    """
+    meshes = []
+    for points, faces in levels:
+        faces = np.asarray(faces)
+        cells = np.hstack([np.full((len(faces), 1), 3), faces]).ravel()
+        meshes.append(pv.PolyData(np.asarray(points), cells))
+
+    plotter = pv.Plotter()
+    plotter.set_background('#1e1e1e')
+    actor = {"current": None}
+
+    def show_level(value):
+        level = int(round(value))
+        if actor["current"] is not None:
+            plotter.remove_actor(actor["current"])
+        actor["current"] = plotter.add_mesh(
+            meshes[level], color='#ccf5ff', show_edges=True, edge_color='#001f3f', reset_camera=False
+        )
+        plotter.add_text(f"LOD {level}: {meshes[level].n_cells} faces", name="lod_label", font_size=10)
+
+    coarsest = len(meshes) - 1
+    show_level(coarsest)
+    if len(meshes) > 1:
+        plotter.add_slider_widget(show_level, [0, coarsest], value=coarsest, title="Level of detail", fmt="%.0f")
+
+    plotter.hide_axes()
+    plotter.camera_position = 'iso'
+    plotter.reset_camera()
+    plotter.show()
+
+
+def plot_mesh_deviation(points, faces, deviation, title="Deviation"):
+    """
+    Show a mesh coloured by a per-vertex deviation scalar (e.g. from compare_meshes).
+    Signed deviations get a diverging colour map centred on zero.
+    """
+    faces = np.asarray(faces)
+    cells = np.hstack([np.full((len(faces), 1), 3), faces]).ravel()
+    mesh = pv.PolyData(np.asarray(points), cells)
+    deviation = np.asarray(deviation)
+    mesh.point_data[title] = deviation
+
+    if len(deviation) and deviation.min() < 0:
+        limit = float(np.abs(deviation).max()) or 1.0
+        cmap, clim = 'coolwarm', [-limit, limit]
+    else:
+        cmap, clim = 'viridis', [0.0, float(deviation.max()) if len(deviation) else 1.0]
+
+    plotter = pv.Plotter()
+    plotter.set_background('#1e1e1e')
+    plotter.add_mesh(mesh, scalars=title, cmap=cmap, clim=clim, smooth_shading=True,
+                     scalar_bar_args={"title": title})
+    plotter.hide_axes()
+    plotter.camera_position = 'iso'
+    plotter.show()
+
+
+def plot_voxels(occupancy, origin, pitch):
+    """
+    Show filled voxels of a boolean occupancy grid (e.g. from voxelize_mesh).
+    origin is the centre of voxel (0, 0, 0).
+    """
+    occupancy = np.asarray(occupancy, dtype=bool)
+    grid = pv.ImageData(
+        dimensions=np.array(occupancy.shape) + 1,
+        spacing=(pitch, pitch, pitch),
+        origin=np.asarray(origin) - 0.5 * pitch,
+    )
+    grid.cell_data["occupied"] = occupancy.ravel(order="F").astype(np.uint8)
+    voxels = grid.threshold(0.5, scalars="occupied")
+
+    plotter = pv.Plotter()
+    plotter.set_background('#1e1e1e')
+    plotter.add_mesh(voxels, color='#ccf5ff', show_edges=True, edge_color='#001f3f')
+    plotter.add_text(f"{int(occupancy.sum())} voxels, pitch {pitch:.4g}", font_size=10)
+    plotter.hide_axes()
+    plotter.camera_position = 'iso'
+    plotter.show()
+
+
+def plot_slices(layers):
+    """
+    Show slice contours (output of slice_mesh) as lines, one colour per height.
+    """
+    points, lines, heights = [], [], []
+    offset = 0
+    for layer in layers:
+        for contour, closed in zip(layer["contours"], layer["closed"]):
+            n = len(contour)
+            points.append(np.column_stack([contour, np.full(n, layer["z"])]))
+            ids = list(range(offset, offset + n)) + ([offset] if closed else [])
+            lines.extend([len(ids)] + ids)
+            heights.extend([layer["z"]] * n)
+            offset += n
+
+    plotter = pv.Plotter()
+    plotter.set_background('#1e1e1e')
+    if points:
+        contours = pv.PolyData(np.vstack(points), lines=np.array(lines))
+        contours.point_data["z"] = np.array(heights)
+        plotter.add_mesh(contours, scalars="z", cmap='viridis', line_width=1, show_scalar_bar=False)
+    plotter.hide_axes()
+    plotter.camera_position = 'iso'
+    plotter.show()